@@ -0,0 +1,147 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import json
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import tuple_, DateTime
+from config import db
+from models import Artist, Venue, Show, Genre, venue_genres, artist_genres
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# Rows are fetched YIELD_PER at a time (through a server-side cursor on
+# Postgres) and each batch is encoded and sent before the next is read, so
+# an export of millions of shows runs in constant memory.
+YIELD_PER = 1000
+
+def to_json(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+# A listing of one model: the fields clients can select, each a column,
+# the key it is ordered and paged by, and the models whose soft-deleted
+# rows are left out.
+class Resource(object):
+  def __init__(self, model, columns, key, live, joins=(), genres=None):
+    self.model = model
+    self.columns = columns
+    self.key = key
+    self.live = live
+    self.joins = joins
+    # (association table, its foreign key) for the genres field
+    self.genres = genres
+    self.fields = list(columns) + (['genres'] if genres is not None else [])
+
+  # The JSON for ?fields=, ?after= and ?limit=, as a generator of strings.
+  # Raises ValueError for arguments it can't read, before anything is sent.
+  def stream(self, args):
+    fields = args.get('fields')
+    fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else self.fields
+    unknown = [f for f in fields if f not in self.fields]
+    if unknown:
+      raise ValueError('unknown fields: ' + ', '.join(unknown))
+    after = self.decode_cursor(args['after']) if args.get('after') else None
+    limit = args.get('limit')
+    if limit is not None:
+      if not limit.isdigit() or int(limit) < 1:
+        raise ValueError('limit must be a positive integer')
+      limit = int(limit)
+    return self.encode(fields, after, limit)
+
+  # One statement, ordered by the key and starting after the cursor. The key
+  # columns are always selected, as _key0, _key1, ..., for the next cursor.
+  def query(self, fields, after):
+    columns = [self.columns[f].label(f) for f in fields if f in self.columns]
+    keys = [column.label('_key%d' % i) for (i, column) in enumerate(self.key)]
+    query = db.session.query(*columns, *keys).select_from(self.model)
+    for (model, on) in self.joins:
+      query = query.join(model, on)
+    for model in self.live:
+      query = query.filter(model.deleted_at.is_(None))
+    if after is not None:
+      query = query.filter(tuple_(*self.key) > tuple_(*after))
+    return query.order_by(*self.key)
+
+  # Genre names of the rows `ids`, in one statement per batch of rows.
+  def genre_names(self, ids):
+    (association, fk) = self.genres
+    names = {}
+    rows = db.session.query(fk, Genre.name) \
+      .join(Genre, Genre.id == association.c.genre_id) \
+      .filter(fk.in_(ids)) \
+      .order_by(fk, Genre.name)
+    for (id, name) in rows:
+      names.setdefault(id, []).append(name)
+    return names
+
+  # {"data": [...], "next": cursor}. `next` is the cursor of the following
+  # page when `limit` cut the listing short, and null at its end; one row
+  # more than `limit` is fetched to tell the two apart.
+  def encode(self, fields, after, limit):
+    query = self.query(fields, after)
+    if limit is not None:
+      query = query.limit(limit + 1)
+    rows = iter(query.yield_per(YIELD_PER))
+    sent = 0
+    last = None
+    more = False
+
+    yield '{"data": ['
+    while not more:
+      batch = list(islice(rows, YIELD_PER))
+      if limit is not None and sent + len(batch) > limit:
+        batch = batch[:limit - sent]
+        more = True
+      if not batch:
+        break
+      genres = self.genre_names([row._key0 for row in batch]) if 'genres' in fields else None
+      items = []
+      for row in batch:
+        item = {f: getattr(row, f) for f in fields if f in self.columns}
+        if genres is not None:
+          item['genres'] = genres.get(row._key0, [])
+        items.append(json.dumps(item, default=to_json))
+      yield (',' if sent else '') + ','.join(items)
+      sent += len(batch)
+      last = batch[-1]
+
+    next_cursor = self.encode_cursor(last) if more else None
+    yield '], "next": %s}' % json.dumps(next_cursor)
+
+  # Cursors are the key values joined by commas, like the /shows cursors.
+  def encode_cursor(self, row):
+    values = [getattr(row, '_key%d' % i) for i in range(len(self.key))]
+    return ','.join(v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+
+  def decode_cursor(self, cursor):
+    values = cursor.split(',')
+    try:
+      if len(values) != len(self.key):
+        raise ValueError
+      return tuple(datetime.fromisoformat(v) if isinstance(column.type, DateTime) else int(v) for (v, column) in zip(values, self.key))
+    except ValueError:
+      raise ValueError('invalid cursor')
+
+RESOURCES = dict(
+  venues = Resource(Venue, dict(
+      id = Venue.id, name = Venue.name, address = Venue.address, city = Venue.city, state = Venue.state,
+      phone = Venue.phone, website = Venue.website, facebook_link = Venue.facebook_link,
+      seeking_talent = Venue.seeking_talent, seeking_description = Venue.seeking_description,
+      image_link = Venue.image_link, updated_at = Venue.updated_at),
+    key=(Venue.id,), live=(Venue,), genres=(venue_genres, venue_genres.c.venue_id)),
+  artists = Resource(Artist, dict(
+      id = Artist.id, name = Artist.name, city = Artist.city, state = Artist.state,
+      phone = Artist.phone, website = Artist.website, facebook_link = Artist.facebook_link,
+      seeking_venue = Artist.seeking_venue, seeking_description = Artist.seeking_description,
+      image_link = Artist.image_link, updated_at = Artist.updated_at),
+    key=(Artist.id,), live=(Artist,), genres=(artist_genres, artist_genres.c.artist_id)),
+  shows = Resource(Show, dict(
+      id = Show.id, start_time = Show.start_time, end_time = Show.end_time,
+      venue_id = Show.venue_id, venue_name = Venue.name, artist_id = Show.artist_id, artist_name = Artist.name),
+    key=(Show.start_time, Show.id), live=(Venue, Artist),
+    joins=((Venue, Venue.id == Show.venue_id), (Artist, Artist.id == Show.artist_id))),
+)
@@ -2,96 +2,116 @@
 # Imports
 #----------------------------------------------------------------------------#
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import os
+from flask import Flask, Blueprint, current_app, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context
 from flask_migrate import Migrate
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
-from datetime import datetime
-import sys
-from config import app, db
-from models import Artist, Venue, Show 
+from datetime import date, datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from config import db, moment, migrate
+from models import Artist, Venue, Show, Genre
+from queries import venue_listing, artist_listing, show_counts, NO_SHOWS, venue_shows, artist_shows, show_page, decode_cursor, venue_version, artist_version, genre_venues, genre_artists, shows_per_day, free_venues
+from areas import group_by_area
+import search
+from suggest import names, refresh_index, setup_suggestions
+from cache import pages
+from conditional import conditional
+import formatting
+from logs import setup_logging
+import metrics
+import importer
+import purge
+import booking
+import api
+from assets import Assets, assets_command
+from templating import setup_templates, startup_command
+from editing import load_for_edit, save_changes, EditConflict
+from schema import create_db_command, stamp_baseline_command
+
+# The views, registered on the app by create_app below.
+main = Blueprint('main', __name__)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
-@app.template_filter('datetime')
+@main.app_template_filter('datetime')
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+  return formatting.format_datetime(value, format)
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
-@app.route('/')
+@main.route('/')
 def index():
   return render_template('pages/home.html')
 
+# Typeahead suggestions for artist and venue names
+@main.route('/search/suggest')
+def suggest():
+  limit = min(request.args.get('limit', 10, type=int), 50)
+  refresh_index(current_app.config['SUGGEST_MAX_AGE'])
+  return jsonify(suggestions=names.suggest(request.args.get('q', ''), limit))
+
+# Page cache hit/miss statistics
+@main.route('/cache/stats')
+def cache_stats():
+  return jsonify(pages.stats())
+
+@main.route('/metrics')
+def show_metrics():
+  return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 #----------------------------------------------------------------------------#
 #  Venues
 #----------------------------------------------------------------------------#
 
 # List all venues
-@app.route('/venues')
+@main.route('/venues')
+@pages.cached('venues')
 def venues():
-  data = []
-  venues = Venue.query.all()
-  for venue in venues:
-    if not any(d.get('city') == venue.city for d in data):
-      data.append(dict(city = venue.city, state = venue.state, venues = [dict(id = venue.id, name = venue.name, num_upcoming_shows = Show.query.filter_by(venue_id=venue.id).count())]))
-    else:
-      city_index = next((index for (index, d) in enumerate(data) if d['city'] == venue.city))
-      data[city_index]['venues'].append(dict(id = venue.id, name = venue.name, num_upcoming_shows = Show.query.filter_by(venue_id=venue.id).count()))
-      
+  data = group_by_area(venue_listing(datetime.utcnow()))
   return render_template('pages/venues.html', areas=data)
 
 # Search a specific venue
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['POST'])
 def search_venues():
-  search_term=request.form.get('search_term')
-  venues = Venue.query.filter(Venue.name.ilike(f'%{search_term}%'))
-  response = dict(count = venues.count(), data = [])
+  search_term=request.form.get('search_term', '')
+  venues = search.search_venues(search_term)
+  counts = show_counts('venue', [venue.id for venue in venues], datetime.utcnow())
+  response = dict(count = len(venues), data = [])
   for venue in venues:
-    response['data'].append(dict(id = venue.id, name = venue.name, num_upcoming_shows = Show.query.filter(Show.venue_id==venue.id).count()))    
+    (num_upcoming_shows, _) = counts.get(venue.id, NO_SHOWS)
+    response['data'].append(dict(id = venue.id, name = venue.name, num_upcoming_shows = num_upcoming_shows))
 
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 # Show a specific venue
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@conditional(venue_version, 'venue_id')
+@pages.cached('venue', 'venue_id')
 def show_venue(venue_id):
-  venue = Venue.query.filter_by(id=venue_id).first()
+  now = datetime.utcnow()
+  venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first_or_404()
   data = dict(id = venue.id, name = venue.name, genres = venue.genres, address= venue.address, city = venue.city, state = venue.state, phone = venue.phone, website = venue.website, facebook_link = venue.facebook_link, seeking_talent = venue.seeking_talent, seeking_description = venue.seeking_description, image_link = venue.image_link, past_shows = [], upcoming_shows = [], past_shows_count = 0, upcoming_shows_count = 0)
-  past_shows = Show.query.filter(Show.venue_id == venue_id, Show.start_time < datetime.utcnow()).all()
-  upcoming_shows = Show.query.filter(Show.venue_id == venue_id, Show.start_time > datetime.utcnow()).all()
-  
-  for ps in past_shows:
-    artist = Artist.query.filter_by(id=ps.artist_id).first()
-    data['past_shows'].append(dict(artist_id = artist.id, artist_name = artist.name, artist_image_link = artist.image_link, start_time = datetime.strftime(ps.start_time, '%B %d %Y - %H:%M:%S')))
+
+  for show in venue_shows(venue_id, now):
+    shows = data['upcoming_shows'] if show.upcoming else data['past_shows']
+    shows.append(dict(artist_id = show.artist_id, artist_name = show.artist_name, artist_image_link = show.artist_image_link, start_time = show.start_time))
   data['past_shows_count'] = len(data['past_shows'])
-  
-  for us in upcoming_shows:
-    artist = Artist.query.filter_by(id=us.artist_id).first()
-    data['upcoming_shows'].append(dict(artist_id = artist.id, artist_name = artist.name, artist_image_link = artist.image_link, start_time = datetime.strftime(us.start_time, '%B %d %Y - %H:%M:%S')))
   data['upcoming_shows_count'] = len(data['upcoming_shows'])
 
   return render_template('pages/show_venue.html', venue=data)
   
 # Create a new venue
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   error = False
   try:
@@ -114,11 +134,13 @@ def create_venue_submission():
     venue.image_link = data['image_link']
     db.session.add(venue)
     db.session.commit()
+    names.add('venue', venue.id, venue.name)
+    pages.invalidate('venues')
 
   except:
-    db.session.commit()
+    db.session.rollback()
     error = True
-    print(sys.exc_info())
+    current_app.logger.exception('%s failed', request.endpoint)
   
   finally:
     db.session.close()
@@ -130,17 +152,34 @@ def create_venue_submission():
   
   return render_template('pages/home.html')
 
-# delete a venue
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+# delete a venue: it is only marked deleted here, its shows and the row
+# itself are purged in the background
+@main.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
+  venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first_or_404()
+  name = venue.name
+  error = False
   try:
-    Venue.query.filter_by(id=venue_id).delete()
+    venue.deleted_at = datetime.utcnow()
     db.session.commit()
+    names.remove('venue', venue_id)
+    # its shows no longer count for the artists either
+    pages.invalidate('venues')
+    pages.invalidate('artists')
+    purger.wake()
   except:
     db.session.rollback()
+    error = True
+    current_app.logger.exception('%s failed', request.endpoint)
   finally:
     db.session.close()
-  return None
+
+  if error:
+    flash('ERROR: Venue ' + name + ' could not be deleted!')
+  else:
+    flash('Venue ' + name + ' was successfully deleted!')
+  # 303 so the client follows up with a GET rather than repeating the DELETE
+  return redirect(url_for('main.index'), code=303)
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
 
@@ -149,147 +188,168 @@ def delete_venue(venue_id):
 #---------------------------------------------------------------------------#
 
 # List all artists
-@app.route('/artists')
+@main.route('/artists')
+@pages.cached('artists')
 def artists():
-  artists = Artist.query.all()
   data = []
-  for artist in artists:
-    data.append(dict(id = artist.id, name = artist.name))
+  for artist in artist_listing(datetime.utcnow()):
+    data.append(dict(id = artist.id, name = artist.name, num_upcoming_shows = artist.num_upcoming_shows))
   
   return render_template('pages/artists.html', artists=data)
 
 # Search a specific artist
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
 def search_artists():
-  search_term = request.form.get('search_term')
-  artists = Artist.query.filter(Artist.name.ilike(f'%{search_term}%'))
-  response = dict(count = artists.count(), data = [])
+  search_term = request.form.get('search_term', '')
+  artists = search.search_artists(search_term)
+  counts = show_counts('artist', [artist.id for artist in artists], datetime.utcnow())
+  response = dict(count = len(artists), data = [])
   for artist in artists:
-    response['data'].append(dict(id = artist.id, name = artist.name, num_upcoming_shows = Show.query.filter(Show.artist_id==artist.id).count()))    
+    (num_upcoming_shows, _) = counts.get(artist.id, NO_SHOWS)
+    response['data'].append(dict(id = artist.id, name = artist.name, num_upcoming_shows = num_upcoming_shows))
 
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 # Show a specific artist
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@conditional(artist_version, 'artist_id')
+@pages.cached('artist', 'artist_id')
 def show_artist(artist_id):
-  artist = Artist.query.filter_by(id=artist_id).first()
-  genres = [x for x in ''.join(',' if not e else e for e in artist.genres).split(',') if x]
-  removetable = str.maketrans('', '', '{}')
-  genres = [s.translate(removetable) for s in genres]
-  data = dict(id = artist.id, name = artist.name, genres = genres, city = artist.city, state = artist.state, phone = artist.phone, website = artist.website, facebook_link = artist.facebook_link, seeking_venue = artist.seeking_venue, seeking_description = artist.seeking_description, image_link = artist.image_link, past_shows = [], upcoming_shows = [], past_shows_count = 0, upcoming_shows_count = 0)
-  past_shows = Show.query.filter(Show.artist_id == artist_id, Show.start_time < datetime.utcnow()).all()
-  upcoming_shows = Show.query.filter(Show.artist_id == artist_id, Show.start_time > datetime.utcnow()).all()
-
-  for ps in past_shows:
-    venue = Venue.query.filter_by(id=ps.venue_id).first()
-    data['past_shows'].append(dict(venue_id = venue.id, venue_name = venue.name, venue_image_link = venue.image_link, start_time = datetime.strftime(ps.start_time, '%B %d %Y - %H:%M:%S')))
+  now = datetime.utcnow()
+  artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first_or_404()
+  data = dict(id = artist.id, name = artist.name, genres = artist.genres, city = artist.city, state = artist.state, phone = artist.phone, website = artist.website, facebook_link = artist.facebook_link, seeking_venue = artist.seeking_venue, seeking_description = artist.seeking_description, image_link = artist.image_link, past_shows = [], upcoming_shows = [], past_shows_count = 0, upcoming_shows_count = 0)
+
+  for show in artist_shows(artist_id, now):
+    shows = data['upcoming_shows'] if show.upcoming else data['past_shows']
+    shows.append(dict(venue_id = show.venue_id, venue_name = show.venue_name, venue_image_link = show.venue_image_link, start_time = show.start_time))
   data['past_shows_count'] = len(data['past_shows'])
-  
-  for us in upcoming_shows:
-    venue = Venue.query.filter_by(id=us.venue_id).first()
-    data['upcoming_shows'].append(dict(venue_id = venue.id, venue_name = venue.name, venue_image_link = venue.image_link, start_time = datetime.strftime(us.start_time, '%B %d %Y - %H:%M:%S')))
   data['upcoming_shows_count'] = len(data['upcoming_shows'])
 
   return render_template('pages/show_artist.html', artist=data)
 
+# delete an artist, like delete_venue
+@main.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first_or_404()
+  name = artist.name
+  error = False
+  try:
+    artist.deleted_at = datetime.utcnow()
+    db.session.commit()
+    names.remove('artist', artist_id)
+    pages.invalidate('artists')
+    pages.invalidate('venues')
+    purger.wake()
+  except:
+    db.session.rollback()
+    error = True
+    current_app.logger.exception('%s failed', request.endpoint)
+  finally:
+    db.session.close()
+
+  if error:
+    flash('ERROR: Artist ' + name + ' could not be deleted!')
+  else:
+    flash('Artist ' + name + ' was successfully deleted!')
+  return redirect(url_for('main.index'), code=303)
+
 # get artist information
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-  artist = Artist.query.filter_by(id=artist_id)
-  form = dict(id = artist.id, name = artist.name, genres = artist.genres, city = artist.city, state = artist.state, phone = artist.phone, website = artist.website, facebook_link = artist.facebook_link, seeking_venue = artist.seeking_venue, seeking_description = artist.seeking_description, image_link = artist.image_link)
+  artist = load_for_edit(Artist, artist_id)
+  form = ArtistForm(obj=artist)
 
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-# update artist information
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+ARTIST_FIELDS = ('name', 'city', 'state', 'phone', 'website', 'facebook_link', 'seeking_description', 'image_link')
+
+# update artist information: only the fields that changed are written, and
+# only if nobody changed the artist since the form was filled
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
-  error = False
-  try: 
-    artist = Artist.query.filter_by(id=artist_id)
-    data = request.form
-    artist.name = data['name']
-    artist.genres = data['genres']
-    artist.city = data['city']
-    artist.state = data['state']
-    artist.phone = data['phone']
-    artist.website = data['website']
-    artist.facebook_link = data['facebook_link']
-    artist.seeking_venue = data['seeking_venue']
-    artist.seeking_description = data['seeking_description']
-    artist.image_link = data['image_link']
+  artist = load_for_edit(Artist, artist_id)
+  data = request.form
+  values = {field: data[field] for field in ARTIST_FIELDS if field in data}
+  # in the order the genres are loaded in, so resubmitting them is no change
+  values.update(genres = sorted(set(data.getlist('genres'))), seeking_venue = 'seeking_venue' in data)
+  error = None
+  try:
+    changed = save_changes(artist, data.get('version', type=int), values)
+    if 'name' in changed:
+      names.add('artist', artist_id, values['name'])
+    if changed:
+      pages.invalidate('artists')
+
+  except EditConflict:
+    error = 'ERROR: Artist ' + data['name'] + ' was changed by someone else while you were editing it. Check its current details and try again.'
 
-    db.session.add(artist)
-    db.session.commit()
-  
   except:
     db.session.rollback()
-    error = True
-    print(sys.exc_info())
+    error = 'ERROR: Artist ' + data['name'] + ' could not be edited!'
+    current_app.logger.exception('%s failed', request.endpoint)
   
   finally:
     db.session.close()
   
   if error:
-    flash('ERROR: Artist ' + request.form['name'] + ' could not be edited!')
-    
-  else:
-    flash('Artist ' + request.form['name'] + ' was successfully updated!')
-  
-  return redirect(url_for('show_artist', artist_id=artist_id))
+    flash(error)
+    return redirect(url_for('main.edit_artist', artist_id=artist_id))
+
+  flash('Artist ' + data['name'] + ' was successfully updated!')
+  return redirect(url_for('main.show_artist', artist_id=artist_id))
     
   
 # get venue information
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-  venue = Venue.query.filter_by(id=venue_id)
-  form = dict(id = venue.id, name = venue.name, genres = venue.genres, address = venue.address, city = venue.city, state = venue.state, phone = venue.phone, website = venue.website, facebook_link = venue.facebook_link, seeking_talent = venue.seeking_talent, seeking_description = venue.seeking_description, image_link = venue.image_link)
+  venue = load_for_edit(Venue, venue_id)
+  form = VenueForm(obj=venue)
 
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-# update venue information
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+VENUE_FIELDS = ('name', 'address', 'city', 'state', 'phone', 'website', 'facebook_link', 'seeking_description', 'image_link')
+
+# update venue information, like edit_artist_submission
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-  error = False
+  venue = load_for_edit(Venue, venue_id)
+  data = request.form
+  values = {field: data[field] for field in VENUE_FIELDS if field in data}
+  # in the order the genres are loaded in, so resubmitting them is no change
+  values.update(genres = sorted(set(data.getlist('genres'))), seeking_talent = 'seeking_talent' in data)
+  error = None
   try:
-    data = request.form
-    venue = Venue.query.filter_by(id=venue_id)
-    venue.name = data['name']
-    venue.genres = data['genres']
-    venue.address = data['address']
-    venue.city = data['city']
-    venue.state = data['state']
-    venue.phone = data['phone']
-    venue.website = data['website']
-    venue.facebook_link = data['facebook_link']
-    venue.seeking_talent = data['seeking_talent']
-    venue.seeking_description = data['seeking_description']
-    venue.image_link = ['image_link']
-    db.session.add(venue)
-    db.session.commit()
-  
+    changed = save_changes(venue, data.get('version', type=int), values)
+    if 'name' in changed:
+      names.add('venue', venue_id, values['name'])
+    if changed:
+      pages.invalidate('venues')
+
+  except EditConflict:
+    error = 'ERROR: Venue ' + data['name'] + ' was changed by someone else while you were editing it. Check its current details and try again.'
+
   except:
     db.session.rollback()
-    print(sys.exc_info)
-    error = True
+    error = 'ERROR: Venue ' + data['name'] + ' could not be edited!'
+    current_app.logger.exception('%s failed', request.endpoint)
 
   finally:
     db.session.close()
 
   if error:
-    flash('ERROR: Venue ' + request.form['name'] + ' could not be edited!')
-  
-  else:
-    flash('Venue ' + request.form['name'] + ' successfully edited!')
-  
-  return redirect(url_for('show_venue', venue_id=venue_id))
+    flash(error)
+    return redirect(url_for('main.edit_venue', venue_id=venue_id))
+
+  flash('Venue ' + data['name'] + ' successfully edited!')
+  return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 # create new artist
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   error = False
   try:
@@ -312,11 +372,13 @@ def create_artist_submission():
 
     db.session.add(artist)
     db.session.commit()
+    names.add('artist', artist.id, artist.name)
+    pages.invalidate('artists')
   
   except:
     db.session.rollback()
     error = True
-    print(sys.exc_info())
+    current_app.logger.exception('%s failed', request.endpoint)
 
   finally:
     db.session.close()
@@ -328,75 +390,200 @@ def create_artist_submission():
   
   return render_template('pages/home.html')
 
+#------------------------------------------------------------------#
+#  Genres
+#------------------------------------------------------------------#
+
+# List the venues and artists of a genre
+@main.route('/genres/<name>')
+def show_genre(name):
+  genre = Genre.query.filter_by(name=name).first_or_404()
+  data = dict(name = genre.name, venues = [], artists = [])
+  for venue in genre_venues(genre.id):
+    data['venues'].append(dict(id = venue.id, name = venue.name, city = venue.city, state = venue.state))
+  for artist in genre_artists(genre.id):
+    data['artists'].append(dict(id = artist.id, name = artist.name, city = artist.city, state = artist.state))
+
+  return render_template('pages/genre.html', genre=data)
+
 #------------------------------------------------------------------#
 #  Shows
 #------------------------------------------------------------------#
 
-# list all shows
-@app.route('/shows')
+# list shows, one page at a time
+@main.route('/shows')
 def shows():
-  shows = Show.query.all()
+  when = request.args.get('when', 'upcoming')
+  since = datetime.utcnow() if when == 'upcoming' else None
+  rows, next_cursor = show_page(after=decode_cursor(request.args.get('after')), since=since)
   data = []
-  for show in shows:
-    venue = Venue.query.filter(Venue.id==show.venue_id).first()
-    artist = Artist.query.filter(Artist.id==show.artist_id).first()
-    data.append(dict(venue_id = venue.id, venue_name = venue.name, artist_id = artist.id, artist_name = artist.name, artist_image_link = artist.image_link, start_time = datetime.strftime(show.start_time, '%B %d %Y - %H:%M:%S')))
+  for show in rows:
+    data.append(dict(venue_id = show.venue_id, venue_name = show.venue_name, artist_id = show.artist_id, artist_name = show.artist_name, artist_image_link = show.artist_image_link, start_time = show.start_time))
+
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor, when=when)
 
-  return render_template('pages/shows.html', shows=data)
+CALENDAR_DAYS = 7
+MAX_CALENDAR_DAYS = 92
+
+# The days [first, last] asked for: ?from=YYYY-MM-DD&to=YYYY-MM-DD, a week
+# from today by default, or the coming (or current) weekend with
+# ?when=weekend. None if the dates don't parse or span too many days.
+def calendar_days(args, today):
+  if args.get('when') == 'weekend':
+    saturday = today + timedelta(days=5 - today.weekday())
+    return saturday, saturday + timedelta(days=1)
+  try:
+    first = date.fromisoformat(args['from']) if args.get('from') else today
+    last = date.fromisoformat(args['to']) if args.get('to') else first + timedelta(days=CALENDAR_DAYS - 1)
+  except ValueError:
+    return None
+  if last < first or (last - first).days >= MAX_CALENDAR_DAYS:
+    return None
+  return first, last
+
+# shows per day and city in a date window; with ?city= also the venues of
+# that city with no show in the window
+@main.route('/shows/calendar')
+def shows_calendar():
+  days = calendar_days(request.args, datetime.utcnow().date())
+  if days is None:
+    abort(400)
+  (first, last) = days
+  start = datetime.combine(first, datetime.min.time())
+  end = datetime.combine(last + timedelta(days=1), datetime.min.time())
+  city = request.args.get('city') or None
+  state = request.args.get('state') or None
+
+  data = dict(
+    from_date = first.isoformat(), to_date = last.isoformat(), city = city, state = state,
+    days = [dict(date = str(day), city = row_city, state = row_state, num_shows = num_shows)
+      for (day, row_city, row_state, num_shows) in shows_per_day(start, end, city, state)],
+    free_venues = [dict(id = venue.id, name = venue.name, city = venue.city, state = venue.state, address = venue.address)
+      for venue in (free_venues(start, end, city, state) if city else [])])
+
+  if request.args.get('format') == 'json' or request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+    return jsonify(data)
+  return render_template('pages/calendar.html', calendar=data)
 
 # create new show
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+# A show is only listed if neither its venue nor its artist has another
+# show at the same time.
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
-  error = False
-  try:
-    data = request.form
-    show = Show()
-    show.venue_id = data['venue_id']
-    show.artist_id = data['artist_id']
-    show.start_time = data['start_time']
-
-    db.session.add(show)
-    db.session.commit()
-  except:
-    db.session.rollback()
-    error = True
-    print(sys.exc_info())
+  form = ShowForm(request.form)
+  error = None
+  if not form.validate() or not form.venue_id.data.isdigit() or not form.artist_id.data.isdigit():
+    error = 'ERROR: Show could not be listed!'
+  else:
+    try:
+      venue_id = int(form.venue_id.data)
+      artist_id = int(form.artist_id.data)
+      start_time = form.start_time.data
+      end_time = start_time + timedelta(minutes=form.duration.data)
+
+      missing = booking.unavailable(venue_id, artist_id)
+      clashes = not missing and booking.conflicts(venue_id, artist_id, start_time, end_time)
+      if missing:
+        error = 'ERROR: Show could not be listed! The %s does not exist or was deleted.' % missing[0]
+      elif clashes:
+        error = 'ERROR: Show could not be listed! The %s already has a show from %s to %s.' % (clashes[0].side, clashes[0].start_time, clashes[0].end_time)
+      else:
+        db.session.add(Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time, end_time=end_time))
+        db.session.commit()
+        pages.invalidate('venues')
+        pages.invalidate('artists')
+    except IntegrityError as e:
+      db.session.rollback()
+      if booking.is_double_booking(e):
+        error = 'ERROR: Show could not be listed! The venue or the artist was just booked at this time.'
+      else:
+        error = 'ERROR: Show could not be listed!'
+        current_app.logger.exception('%s failed', request.endpoint)
+    except:
+      db.session.rollback()
+      error = 'ERROR: Show could not be listed!'
+      current_app.logger.exception('%s failed', request.endpoint)
+    finally:
+      db.session.close()
 
-  finally:
-    db.session.close()
-  
   if error:
-    flash('ERROR: Show could not be listed!')
+    flash(error)
   else:
     flash('Show successfully listed!')
   
   return render_template('pages/home.html')
 
+#----------------------------------------------------------------------------#
+#  API
+#----------------------------------------------------------------------------#
+
+# Venues, artists or shows as JSON, streamed in chunks while they are read.
+# ?fields=id,name picks the fields, ?limit= pages the listing and ?after=
+# takes the `next` cursor of the previous page.
+@main.route('/api/v1/<any(venues, artists, shows):resource>')
+def api_listing(resource):
+  try:
+    body = api.RESOURCES[resource].stream(request.args)
+  except ValueError as error:
+    return jsonify(error = str(error)), 400
+  return Response(stream_with_context(body), mimetype='application/json')
+
 # handle 404 error
-@app.errorhandler(404)
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 #handle 500 error
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
+#----------------------------------------------------------------------------#
+# App factory.
+#----------------------------------------------------------------------------#
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+purger = purge.Purger()
+assets = Assets()
+
+importer.cli.add_command(purge.purge_command)
+importer.cli.add_command(assets_command)
+importer.cli.add_command(startup_command)
+importer.cli.add_command(create_db_command)
+importer.cli.add_command(stamp_baseline_command)
+
+# The app, configured from config.py and then from `config`: a dict of
+# settings, or an object or import path for app.config.from_object. The
+# `flask` command and gunicorn (see gunicorn.conf.py) call it once per
+# process.
+def create_app(config=None):
+  app = Flask(__name__)
+  app.config.from_object('config')
+  if isinstance(config, dict):
+    app.config.update(config)
+  elif config is not None:
+    app.config.from_object(config)
+
+  db.init_app(app)
+  moment.init_app(app)
+  migrate.init_app(app, db, directory=os.path.join(app.root_path, 'migrations'))
+  pages.init_app(app)
+  assets.init_app(app)
+  app.register_blueprint(main)
+  app.cli.add_command(importer.cli)
+
+  metrics.setup_metrics(app)
+  # after setup_metrics, so warmed templates are built as TimedTemplates
+  setup_templates(app)
+  setup_suggestions(app)
+  if not app.debug and not app.testing:
+    setup_logging(app)
     app.logger.info('errors')
+  return app
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -404,11 +591,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
\ No newline at end of file
@@ -0,0 +1,19 @@
+#----------------------------------------------------------------------------#
+# Area grouping.
+#----------------------------------------------------------------------------#
+
+# Groups venue rows (anything with id, name, city, state and
+# num_upcoming_shows attributes) into the `areas` payload of the venues page.
+# Venues are bucketed by (city, state) in a dict, so the grouping is linear
+# in the number of venues and same-named cities in different states stay
+# apart. Areas are sorted by state then city; venues keep their input order.
+def group_by_area(venues):
+  areas = {}
+  for venue in venues:
+    key = (venue.city, venue.state)
+    area = areas.get(key)
+    if area is None:
+      area = areas[key] = dict(city = venue.city, state = venue.state, venues = [])
+    area['venues'].append(dict(id = venue.id, name = venue.name, num_upcoming_shows = venue.num_upcoming_shows))
+
+  return [areas[key] for key in sorted(areas, key=lambda k: (k[1] or '', k[0] or ''))]
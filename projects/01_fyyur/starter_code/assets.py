@@ -0,0 +1,257 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from datetime import timedelta
+import click
+from flask.cli import with_appcontext
+from flask import current_app, request, url_for, send_from_directory, abort
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+try:
+  import rjsmin
+except ImportError:
+  rjsmin = None
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#
+# `flask fyyur assets` builds static/dist: the bundles below, concatenated
+# and minified, and a copy of every other static file, all named after a
+# hash of their content, next to gzip and brotli variants, plus a manifest
+# mapping source names to built ones. Built files never change under their
+# name, so /assets serves them with far-future immutable caching. Without a
+# build, templates fall back to the source files under /static.
+#
+# A build keeps the files of the KEEP_BUILDS - 1 builds before it, and
+# /assets still serves them: a page rendered before a deploy, by a worker
+# that still runs the old build or kept by a browser or a proxy, goes on
+# finding its assets. Older files are deleted.
+#----------------------------------------------------------------------------#
+
+BUNDLES = {
+  'site.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css', 'css/main.responsive.css', 'css/main.quickfix.css'],
+  'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+  'site.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+MAX_AGE = timedelta(days=365)
+KEEP_BUILDS = 3
+
+# compressing these doesn't pay: images and fonts are compressed already
+COMPRESSED = {'.css', '.js', '.map', '.svg', '.ttf', '.otf', '.eot', '.json'}
+
+def fingerprint(path, content):
+  (base, ext) = os.path.splitext(path)
+  return '%s.%s%s' % (base, hashlib.sha256(content).hexdigest()[:12], ext)
+
+# Whitespace and comments out; only whitespace that can't change the
+# meaning of a rule goes.
+def minify_css(text):
+  text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+  text = re.sub(r'\s+', ' ', text)
+  text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+  text = re.sub(r':\s+', ':', text)
+  return text.replace(';}', '}').strip()
+
+# Minified with rjsmin, keeping /*! license comments, when it is installed;
+# the libraries are minified upstream already, but js/script.js and
+# js/plugins.js aren't. Either way the source map comments go: they would
+# point at files that aren't there.
+def minify_js(text):
+  text = re.sub(r'^\s*//[#@] sourceMappingURL=.*$', '', text, flags=re.M)
+  if rjsmin is not None:
+    text = rjsmin.jsmin(text, keep_bang_comments=True)
+  return text.strip()
+
+# url(...) references in a stylesheet at `path`, rewritten to the built
+# name of the file they point to, if it was built. The bundle is written
+# next to the stylesheets, so other references still resolve.
+def rewrite_urls(text, path, built):
+  def rewrite(match):
+    url = match.group(2)
+    (target, suffix) = re.match(r'([^?#]*)(.*)', url).groups()
+    if not target or re.match(r'^(\w+:|/)', target):
+      return match.group(0)
+    source = os.path.normpath(os.path.join(os.path.dirname(path), target)).replace(os.sep, '/')
+    if source not in built:
+      return match.group(0)
+    return 'url("%s%s")' % (os.path.relpath(built[source], os.path.dirname(path)).replace(os.sep, '/'), suffix)
+  return re.sub(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''', rewrite, text)
+
+# gzip and brotli variants of the built file `name`, where smaller.
+def compress(folder, name, content):
+  encodings = []
+  if os.path.splitext(name)[1] not in COMPRESSED:
+    return encodings
+  variants = [('gzip', '.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+  if brotli is not None:
+    variants.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+  for (encoding, suffix, compressor) in variants:
+    data = compressor(content)
+    if len(data) < len(content):
+      with open(os.path.join(folder, name + suffix), 'wb') as f:
+        f.write(data)
+      encodings.append(encoding)
+  return encodings
+
+def write(folder, name, content, manifest):
+  path = os.path.join(folder, name)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'wb') as f:
+    f.write(content)
+  manifest['encodings'][name] = compress(folder, name, content)
+
+# Builds static_folder/dist and returns its manifest. Its `previous` lists
+# the encodings of the files only the earlier kept builds use, newest first.
+def build(static_folder, keep=KEEP_BUILDS):
+  folder = os.path.join(static_folder, DIST)
+  earlier = Assets.load(folder)
+  manifest = dict(assets = {}, encodings = {})
+
+  for (root, dirs, files) in os.walk(static_folder):
+    dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != folder)
+    for filename in sorted(files):
+      if filename.startswith('.'):
+        continue
+      source = os.path.relpath(os.path.join(root, filename), static_folder).replace(os.sep, '/')
+      with open(os.path.join(root, filename), 'rb') as f:
+        content = f.read()
+      name = fingerprint(source, content)
+      write(folder, name, content, manifest)
+      manifest['assets'][source] = name
+
+  for (bundle, sources) in BUNDLES.items():
+    kind = os.path.splitext(bundle)[1]
+    parts = []
+    for source in sources:
+      with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+        text = f.read()
+      if kind == '.css':
+        parts.append(minify_css(rewrite_urls(text, source, manifest['assets'])))
+      else:
+        parts.append(minify_js(text))
+    # ; keeps one script's last statement from running into the next one's
+    content = ('\n' if kind == '.css' else ';\n').join(parts).encode('utf-8')
+    name = fingerprint(os.path.join(kind[1:], bundle), content)
+    write(folder, name, content, manifest)
+    manifest['assets'][bundle] = name
+
+  # a build that changed nothing doesn't push an earlier one out
+  previous = []
+  for encodings in [earlier['encodings']] + earlier['previous']:
+    encodings = {name: e for (name, e) in encodings.items() if name not in manifest['encodings']}
+    if encodings:
+      previous.append(encodings)
+  manifest['previous'] = previous[:keep - 1]
+
+  with open(os.path.join(folder, MANIFEST), 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  prune(folder, manifest)
+  return manifest
+
+# Deletes the files in `folder` that neither the build of `manifest` nor
+# its previous builds use.
+def prune(folder, manifest):
+  kept = set(manifest['encodings']).union(*manifest['previous'])
+  for (root, dirs, files) in os.walk(folder):
+    for filename in files:
+      name = os.path.relpath(os.path.join(root, filename), folder).replace(os.sep, '/')
+      variant = name[:-3] if name.endswith(('.br', '.gz')) else None
+      if name != MANIFEST and name not in kept and variant not in kept:
+        os.remove(os.path.join(root, filename))
+
+# Serves the build under /assets and gives templates asset_url(path) for a
+# static file and asset_urls(bundle) for the files of a bundle. Each app
+# reads the manifest of its own static folder in init_app.
+class Assets(object):
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.extensions['assets'] = self.load(os.path.join(app.static_folder, DIST))
+    app.add_url_rule('/assets/<path:filename>', 'asset_file', self.send)
+    app.add_template_global(self.url, 'asset_url')
+    app.add_template_global(self.urls, 'asset_urls')
+
+  @staticmethod
+  def load(folder):
+    try:
+      with open(os.path.join(folder, MANIFEST)) as f:
+        manifest = json.load(f)
+    except FileNotFoundError:
+      manifest = dict(assets = {}, encodings = {})
+    manifest.setdefault('previous', [])
+    manifest['folder'] = folder
+    manifest['hash'] = hashlib.sha256(json.dumps(manifest['assets'], sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return manifest
+
+  @property
+  def manifest(self):
+    return current_app.extensions['assets']
+
+  def url(self, path):
+    assets = self.manifest['assets']
+    if path in assets:
+      return url_for('asset_file', filename=assets[path])
+    return url_for('static', filename=path)
+
+  def urls(self, bundle):
+    assets = self.manifest['assets']
+    if bundle in assets:
+      return [url_for('asset_file', filename=assets[bundle])]
+    return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+  # The smallest variant the client accepts. Only the files of the kept
+  # builds are served.
+  def send(self, filename):
+    manifest = self.manifest
+    encodings = manifest['encodings'].get(filename)
+    if encodings is None:
+      encodings = next((build[filename] for build in manifest['previous'] if filename in build), None)
+    if encodings is None:
+      abort(404)
+    (mimetype, _) = mimetypes.guess_type(filename)
+    encoding = next((e for e in encodings if request.accept_encodings[e]), None)
+    suffix = dict(br = '.br', gzip = '.gz').get(encoding, '')
+    response = send_from_directory(manifest['folder'], filename + suffix, mimetype=mimetype, max_age=int(MAX_AGE.total_seconds()), download_name=os.path.basename(filename))
+    if encoding:
+      response.content_encoding = encoding
+    if encodings:
+      response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# The deployed code and static build, as APP_VERSION and the manifest hash.
+# Rendered pages link to built asset names, so whatever keeps a page around
+# has to tell releases apart.
+def release():
+  return '%s:%s' % (current_app.config['APP_VERSION'], current_app.extensions['assets']['hash'])
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+@click.command('assets')
+@with_appcontext
+def assets_command():
+  """Bundle, fingerprint and precompress the static files."""
+  manifest = build(current_app.static_folder)
+  click.echo('built %d assets in %s' % (len(manifest['assets']), os.path.join(current_app.static_folder, DIST)))
+  if brotli is None:
+    click.echo('brotli is not installed, only gzip variants were written')
+  if rjsmin is None:
+    click.echo('rjsmin is not installed, scripts were bundled without minifying them')
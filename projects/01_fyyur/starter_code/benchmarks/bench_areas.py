@@ -0,0 +1,33 @@
+#----------------------------------------------------------------------------#
+# Microbenchmark for areas.group_by_area.
+#
+#   $ python benchmarks/bench_areas.py
+#
+# Groups synthetic venue rows at increasing volumes and prints the cost per
+# venue, which should stay flat up to 100k venues if grouping is linear.
+#----------------------------------------------------------------------------#
+import os
+import sys
+import timeit
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from areas import group_by_area
+
+Row = namedtuple('Row', 'id name city state num_upcoming_shows')
+STATES = ['CA', 'NY', 'TX', 'WA', 'IL', 'MA', 'OR', 'CO', 'FL', 'GA']
+
+def make_rows(n):
+  # roughly one city per 20 venues, reused across states
+  return [Row(i, 'Venue %d' % i, 'City %d' % (i % max(n // 200, 1)), STATES[i % len(STATES)], i % 7) for i in range(n)]
+
+def main():
+  print('%10s %12s %14s' % ('venues', 'total (ms)', 'per venue (ns)'))
+  for n in (1000, 10000, 100000):
+    rows = make_rows(n)
+    runs = max(1, 200000 // n)
+    best = min(timeit.repeat(lambda: group_by_area(rows), number=runs, repeat=5)) / runs
+    print('%10d %12.2f %14.1f' % (n, best * 1e3, best * 1e9 / n))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,64 @@
+#----------------------------------------------------------------------------#
+# Benchmark for formatting.format_datetime.
+#
+#   $ python benchmarks/bench_formatting.py
+#
+# Formats the start times of a page of shows the old way (strftime in the
+# controller, dateutil + babel.dates.format_datetime in the template filter)
+# and with the precompiled formatters, and prints the time per show.
+#
+# The old path can't run under the pinned python-dateutil 2.6.0 on Python
+# 3.10 and later, where its parser still looks up collections.Callable; it
+# is skipped there and only format_datetime is timed.
+#----------------------------------------------------------------------------#
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import formatting
+
+SHOWS = 500
+
+def old_filter(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format)
+
+def old(start_times):
+  return [old_filter(datetime.strftime(t, '%B %d %Y - %H:%M:%S'), 'full') for t in start_times]
+
+def new(start_times):
+  return [formatting.format_datetime(t, 'full') for t in start_times]
+
+# False when this python-dateutil can't parse on this Python.
+def old_runs():
+  try:
+    dateutil.parser.parse('2026-01-01 20:00:00')
+  except AttributeError:
+    return False
+  return True
+
+def main():
+  start = datetime(2026, 1, 1, 20, 0)
+  start_times = [start + timedelta(hours=7 * i) for i in range(SHOWS)]
+  paths = [('format_datetime', new)]
+  if old_runs():
+    assert old(start_times) == new(start_times)
+    paths.insert(0, ('strftime + dateutil + babel', old))
+
+  print('%-28s %14s' % ('%d shows' % SHOWS, 'per show (us)'))
+  if len(paths) == 1:
+    print('%-28s %14s' % ('strftime + dateutil + babel', 'skipped'))
+  for (name, fn) in paths:
+    best = min(timeit.repeat(lambda: fn(start_times), number=5, repeat=5)) / 5
+    print('%-28s %14.1f' % (name, best * 1e6 / SHOWS))
+
+if __name__ == '__main__':
+  main()
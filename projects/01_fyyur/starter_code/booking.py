@@ -0,0 +1,100 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from bisect import bisect_left, insort
+from sqlalchemy import or_, case, literal
+from config import db
+from models import Artist, Show, Venue, MAX_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Double booking.
+#----------------------------------------------------------------------------#
+
+SIDES = (('venue', Show.venue_id), ('artist', Show.artist_id))
+
+# The shows that overlap booking [start_time, end_time) for the venue or the
+# artist, as (side, id, start_time, end_time) rows. A show lasts at most
+# MAX_SHOW_DURATION, so only shows starting in
+# (start_time - MAX_SHOW_DURATION, end_time) can overlap: one statement
+# with a short range scan of the (venue_id, start_time) and
+# (artist_id, start_time) indexes.
+def conflicts(venue_id, artist_id, start_time, end_time):
+  side = case((Show.venue_id == venue_id, literal('venue')), else_=literal('artist'))
+  return db.session.query(side.label('side'), Show.id, Show.start_time, Show.end_time) \
+    .filter(or_(Show.venue_id == venue_id, Show.artist_id == artist_id)) \
+    .filter(Show.start_time > start_time - MAX_SHOW_DURATION, Show.start_time < end_time, Show.end_time > start_time) \
+    .order_by(Show.start_time) \
+    .all()
+
+# The sides, 'venue' and/or 'artist', that can't be booked because there
+# is no such row or it was deleted (deleted rows stay until purged). One
+# statement.
+def unavailable(venue_id, artist_id):
+  live = db.session.query(
+      db.session.query(Venue.id).filter(Venue.id == venue_id, Venue.deleted_at.is_(None)).exists(),
+      db.session.query(Artist.id).filter(Artist.id == artist_id, Artist.deleted_at.is_(None)).exists()
+    ).one()
+  return [side for ((side, _), found) in zip(SIDES, live) if not found]
+
+# Whether an IntegrityError comes from the Postgres exclusion constraints,
+# i.e. a concurrent request booked the same slot first.
+def is_double_booking(error):
+  return getattr(error.orig, 'pgcode', None) == '23P01'
+
+# Overlap check for imports. Each batch of show rows is checked against the
+# shows already in the database near the batch's time window, fetched with
+# one statement per side, and against the rows accepted earlier in the
+# run; the intervals of each venue and artist are kept sorted and every
+# row is a bisect.
+class BookingChecker(object):
+  def __init__(self):
+    # accepted rows not in the database yet, by (side, key)
+    self.pending = {}
+
+  def check(self, batch):
+    if not batch:
+      return [], []
+    low = min(row['start_time'] for (_, _, row) in batch) - MAX_SHOW_DURATION
+    high = max(row['end_time'] for (_, _, row) in batch)
+    intervals = {}
+    for (side, column) in SIDES:
+      keys = {row[side + '_id'] for (_, _, row) in batch}
+      shows = db.session.query(column, Show.start_time, Show.end_time) \
+        .filter(column.in_(keys), Show.start_time > low, Show.start_time < high)
+      for (key, start_time, end_time) in shows:
+        intervals.setdefault((side, key), []).append((start_time, end_time))
+      for key in keys:
+        intervals.setdefault((side, key), []).extend(self.pending.get((side, key), []))
+    for spans in intervals.values():
+      spans.sort()
+
+    accepted = []
+    rejected = []
+    for (line, record, row) in batch:
+      errors = {}
+      for (side, _) in SIDES:
+        if overlaps(intervals[(side, row[side + '_id'])], row['start_time'], row['end_time']):
+          errors[side] = ['The %s already has a show at this time.' % side]
+      if errors:
+        rejected.append((line, record, errors))
+        continue
+      for (side, _) in SIDES:
+        span = (row['start_time'], row['end_time'])
+        insort(intervals[(side, row[side + '_id'])], span)
+        insort(self.pending.setdefault((side, row[side + '_id']), []), span)
+      accepted.append((line, record, row))
+    return accepted, rejected
+
+  # The accepted rows were committed and the database query covers them.
+  def committed(self):
+    self.pending.clear()
+
+# Whether [start_time, end_time) overlaps any of the sorted `spans`. Only the
+# spans starting within MAX_SHOW_DURATION before end_time are looked at.
+def overlaps(spans, start_time, end_time):
+  i = bisect_left(spans, (end_time,))
+  while i > 0 and spans[i - 1][0] > start_time - MAX_SHOW_DURATION:
+    i -= 1
+    if spans[i][1] > start_time:
+      return True
+  return False
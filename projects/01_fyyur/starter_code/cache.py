@@ -0,0 +1,190 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from flask import g, session, current_app
+from assets import release
+from routing import sticks_to_primary
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+# In-process LRU bounded both by number of entries and by total size of the
+# cached bodies. Entries also expire after `timeout` seconds, since pages
+# move shows from upcoming to past as time passes without any write.
+class LRUCache(object):
+  def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, timeout=300):
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.timeout = timeout
+    self.entries = OrderedDict()
+    self.size = 0
+    self.evictions = 0
+    self.lock = Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      (expires, value) = entry
+      if expires < time.monotonic():
+        self._delete(key)
+        return None
+      self.entries.move_to_end(key)
+      return value
+
+  def set(self, key, value):
+    if len(value) > self.max_bytes:
+      return
+    with self.lock:
+      self._delete(key)
+      self.entries[key] = (time.monotonic() + self.timeout, value)
+      self.size += len(value)
+      while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+        (_, (_, evicted)) = self.entries.popitem(last=False)
+        self.size -= len(evicted)
+        self.evictions += 1
+
+  def delete(self, key):
+    with self.lock:
+      self._delete(key)
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.size = 0
+
+  def stats(self):
+    return dict(entries = len(self.entries), bytes = self.size, evictions = self.evictions)
+
+  def _delete(self, key):
+    entry = self.entries.pop(key, None)
+    if entry is not None:
+      self.size -= len(entry[1])
+
+# Shared cache in Redis, so every worker sees the same entries and
+# invalidations. Needs the `redis` package.
+class RedisCache(object):
+  def __init__(self, url, timeout=300, prefix='fyyur:page:'):
+    import redis
+    self.client = redis.Redis.from_url(url)
+    self.timeout = timeout
+    self.prefix = prefix
+
+  def get(self, key):
+    value = self.client.get(self.prefix + key)
+    return value.decode('utf-8') if value is not None else None
+
+  def set(self, key, value):
+    self.client.set(self.prefix + key, value.encode('utf-8'), ex=self.timeout)
+
+  def delete(self, key):
+    self.client.delete(self.prefix + key)
+
+  def clear(self):
+    keys = list(self.client.scan_iter(self.prefix + '*'))
+    if keys:
+      self.client.delete(*keys)
+
+  def stats(self):
+    return dict()
+
+# Caches nothing. The in-process LRU can't serve several worker processes:
+# a write only invalidates the entries of the process that handled it.
+class NullCache(object):
+  def get(self, key):
+    return None
+
+  def set(self, key, value):
+    pass
+
+  def delete(self, key):
+    pass
+
+  def clear(self):
+    pass
+
+  def stats(self):
+    return dict()
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Caches rendered pages under '<release>:<route>:<id>' keys, so a page
+# linking to the assets of another build (shared through Redis by workers
+# of the previous deploy) is never served. Views opt in with
+# @pages.cached(route, id_arg). Pages behind @conditional are keyed on
+# their version too (g.page_version) and never go stale; for the others
+# the submission handlers call pages.invalidate(route) for every page their
+# write changes.
+#
+# Without a backend of its own, each app gets the one its PAGE_CACHE_*
+# settings ask for in init_app, and the cache uses the current app's.
+class PageCache(object):
+  def __init__(self, backend=None):
+    self._backend = backend
+    self.hits = 0
+    self.misses = 0
+
+  def init_app(self, app):
+    backend = app.extensions['page_cache'] = create_backend(app.config)
+    if isinstance(backend, NullCache):
+      app.logger.warning('page cache off: %d processes serve the app and PAGE_CACHE_REDIS_URL is not set', app.config['SERVER_PROCESSES'])
+
+  @property
+  def backend(self):
+    if self._backend is not None:
+      return self._backend
+    return current_app.extensions['page_cache']
+
+  @staticmethod
+  def key(route, id=None, version=None):
+    key = f'{release()}:{route}:{"" if id is None else id}'
+    return key if version is None else f'{key}:{version}'
+
+  def cached(self, route, id_arg=None):
+    def decorator(view):
+      @wraps(view)
+      def wrapper(*args, **kwargs):
+        # a pending flash message would be rendered into the page; a
+        # client that just wrote must see its write
+        if '_flashes' in session or sticks_to_primary():
+          return view(*args, **kwargs)
+        key = self.key(route, kwargs.get(id_arg), g.get('page_version'))
+        body = self.backend.get(key)
+        if body is not None:
+          self.hits += 1
+          return body
+        self.misses += 1
+        body = view(*args, **kwargs)
+        if isinstance(body, str):
+          self.backend.set(key, body)
+        return body
+      return wrapper
+    return decorator
+
+  def invalidate(self, route, id=None):
+    self.backend.delete(self.key(route, id))
+
+  def clear(self):
+    self.backend.clear()
+
+  def stats(self):
+    stats = dict(hits = self.hits, misses = self.misses)
+    stats.update(self.backend.stats())
+    return stats
+
+def create_backend(config):
+  if config.get('PAGE_CACHE_REDIS_URL'):
+    return RedisCache(config['PAGE_CACHE_REDIS_URL'], timeout=config['PAGE_CACHE_TIMEOUT'])
+  if config.get('SERVER_PROCESSES', 1) > 1:
+    return NullCache()
+  return LRUCache(config['PAGE_CACHE_MAX_ENTRIES'], config['PAGE_CACHE_MAX_BYTES'], config['PAGE_CACHE_TIMEOUT'])
+
+pages = PageCache()
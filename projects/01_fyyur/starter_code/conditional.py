@@ -0,0 +1,51 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import g, request, session, make_response, abort
+from assets import release
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+# Answers If-None-Match for a detail page before the view runs.
+# `version(id, now)` returns the row of queries.entity_version for the
+# requested entity (or None for a 404); its values and the release are
+# hashed into a strong ETag so a matching client gets a 304 without the page
+# being rendered. The row counts upcoming shows, so the ETag also changes
+# when a show starts.
+#
+# The view runs with g.page_version set to the ETag, which @pages.cached
+# adds to its key: a cached page is only served for the version it was
+# rendered from, whichever process changed the rows since.
+#
+# There is no Last-Modified: a page changes when one of its shows moves from
+# upcoming to past without any row being updated, so an If-Modified-Since
+# date can't tell whether it did.
+def conditional(version, id_arg):
+  def decorator(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+      # a pending flash message has to be rendered into a fresh page
+      if '_flashes' in session:
+        return view(*args, **kwargs)
+      row = version(kwargs[id_arg], datetime.utcnow())
+      if row is None:
+        abort(404)
+      etag = hashlib.sha1(repr((release(), tuple(row))).encode('utf-8')).hexdigest()
+
+      if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+      else:
+        g.page_version = etag
+        response = make_response(view(*args, **kwargs))
+
+      response.set_etag(etag)
+      # let browsers keep the page but ask us again every time
+      response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
@@ -1,27 +1,102 @@
 import os
-from flask import Flask
+import tempfile
 from flask_migrate import Migrate
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from routing import RoutingSQLAlchemy
 
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Settings are read from the environment; app.create_app loads this module
+# and then applies its own overrides.
+
+# A random key generated once and kept at `path`, so every process on this
+# machine reads the same one. The first process to link its key into place
+# wins; the others read that key.
+def shared_secret(path):
+  if not os.path.exists(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    (fd, candidate) = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+      f.write(os.urandom(32))
+    try:
+      os.link(candidate, path)
+    except FileExistsError:
+      pass
+    finally:
+      os.remove(candidate)
+  with open(path, 'rb') as f:
+    return f.read()
+
+# Signs the session cookie that carries flash messages, so all workers must
+# share it. Set SECRET_KEY when running on more than one machine.
+SECRET_KEY = os.environ.get('SECRET_KEY') or shared_secret(os.path.join(basedir, 'instance', 'secret_key'))
+
+# Enable debug mode. Serving with gunicorn.conf.py turns it off.
+DEBUG = os.environ.get('FLASK_DEBUG', '1') == '1'
+
+# Log file, written as JSON lines off the request path when not in debug
+# mode. Rotates at LOG_MAX_BYTES, or on a schedule if LOG_ROTATE_WHEN is set
+# (e.g. 'midnight'), when a single process serves the app; with several
+# (SERVER_PROCESSES), rotate it externally, e.g. with logrotate.
+LOG_FILE = os.environ.get('LOG_FILE', 'error.log')
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN')
+
+# Statements slower than this many seconds are logged with the route that
+# ran them. Unset to turn the slow query log off.
+SLOW_QUERY_SECONDS = float(os.environ['SLOW_QUERY_SECONDS']) if os.environ.get('SLOW_QUERY_SECONDS') else None
+
+# Deleted venues and artists are only marked deleted by the request; their
+# shows and rows are then removed by a background thread, this many rows per
+# transaction. Without the thread, run `flask fyyur purge` periodically.
+PURGE_IN_BACKGROUND = True
+PURGE_BATCH_SIZE = 1000
+
+# Each worker rebuilds its typeahead index when it is older than this many
+# seconds, to pick up names the other workers wrote.
+SUGGEST_MAX_AGE = int(os.environ.get('SUGGEST_MAX_AGE', 60))
+
+# Identifies the deployed code, e.g. its commit; part of every page's ETag.
+APP_VERSION = os.environ.get('APP_VERSION', '')
+
+# Rendered page cache. Set PAGE_CACHE_REDIS_URL to share it between workers;
+# without it, the cache is off when more than one process serves the app
+# (SERVER_PROCESSES, set by gunicorn.conf.py).
+PAGE_CACHE_MAX_ENTRIES = 1024
+PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PAGE_CACHE_TIMEOUT = 300
+PAGE_CACHE_REDIS_URL = os.environ.get('PAGE_CACHE_REDIS_URL')
+SERVER_PROCESSES = int(os.environ.get('SERVER_PROCESSES', 1))
+
+# Compiled templates are cached here across restarts. Set TEMPLATE_WARMUP
+# to compile (or load) them all at startup instead of on first use.
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'fyyur-templates'))
+TEMPLATE_WARMUP = bool(os.environ.get('TEMPLATE_WARMUP'))
 
 # Connect to the database
 
-SQLALCHEMY_DATABASE_URI = '...'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', '...')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Optional read replica. GET requests read from it, except for a client
+# that wrote within the last REPLICA_STICKY_SECONDS.
+SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URL']} if os.environ.get('DATABASE_REPLICA_URL') else None
+REPLICA_STICKY_SECONDS = 10
+
+# Connection pool of each engine. DB_STATEMENT_TIMEOUT is in milliseconds
+# and applies on Postgres.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = 10
+DB_POOL_RECYCLE = 1800
+DB_POOL_PRE_PING = True
+DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 5000))
 
 #----------------------------------------------------------------------------#
-# App Config.
+# Extensions, bound to the app by app.create_app.
 #----------------------------------------------------------------------------#
-app = Flask(__name__)
-db = SQLAlchemy(app)
-moment = Moment(app)
-app.config.from_object('config')
-app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-migrate = Migrate(app, db)
+db = RoutingSQLAlchemy()
+moment = Moment()
+migrate = Migrate()
@@ -0,0 +1,56 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from flask import abort
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from config import db
+
+#----------------------------------------------------------------------------#
+# Edits.
+#
+# An edit form carries the version of the row it was filled from. Saving
+# it writes only the fields that changed, in one
+#   UPDATE ... SET <changed columns>, version = :v + 1 WHERE id = :id AND version = :v
+# (Venue, Artist and Show map `version` as their version_id_col), so two
+# people editing different fields don't undo each other's change, and an
+# edit of a row that changed since its form was filled is refused instead
+# of overwriting the other edit.
+#----------------------------------------------------------------------------#
+
+# The row changed after the form was filled.
+class EditConflict(Exception):
+  pass
+
+# The live venue or artist `id` with its genres, in one statement, or a 404.
+def load_for_edit(model, id):
+  entity = model.query.options(joinedload(model.genre_objects)) \
+    .filter(model.id == id, model.deleted_at.is_(None)) \
+    .one_or_none()
+  if entity is None:
+    abort(404)
+  return entity
+
+# A blank field or an unticked box leaves an unset (NULL) column alone.
+def differs(old, new):
+  return old != new and not (old is None and new in ('', False))
+
+# Sets the `values` that differ from the entity's and commits them. `version`
+# is the one the form was filled from, or None to only guard against
+# changes since the entity was loaded. Returns the names of the changed
+# fields; with none, nothing is written. Raises EditConflict.
+def save_changes(entity, version, values):
+  if version is not None and version != entity.version:
+    raise EditConflict()
+  changed = [field for (field, value) in values.items() if differs(getattr(entity, field), value)]
+  # setting genres looks the names up; flushing the other changes before
+  # that would split the edit into two UPDATEs
+  with db.session.no_autoflush:
+    for field in changed:
+      setattr(entity, field, values[field])
+  try:
+    db.session.commit()
+  except StaleDataError:
+    db.session.rollback()
+    raise EditConflict()
+  return changed
@@ -0,0 +1,37 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from datetime import datetime, timezone
+from functools import lru_cache
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+
+# Named formats of the `datetime` template filter, as babel patterns.
+FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+# A formatting function for one (format, locale) pair. The babel pattern
+# and locale are parsed once and reused for every later call.
+@lru_cache(maxsize=64)
+def formatter(format='medium', locale=None):
+  pattern = babel.dates.parse_pattern(FORMATS.get(format, format))
+  locale = Locale.parse(locale or babel.dates.LC_TIME)
+  def apply(value):
+    if value.tzinfo is None:
+      value = value.replace(tzinfo=timezone.utc)
+    return pattern.apply(value, locale)
+  return apply
+
+# Formats a datetime. Strings are still accepted and parsed, but callers
+# should hand over the datetime they already have.
+def format_datetime(value, format='medium', locale=None):
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  return formatter(format, locale)(value)
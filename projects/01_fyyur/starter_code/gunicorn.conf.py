@@ -0,0 +1,44 @@
+#----------------------------------------------------------------------------#
+# Multi-process serving.
+#
+#   $ gunicorn
+#   $ WEB_CONCURRENCY=8 GUNICORN_THREADS=4 PORT=8000 gunicorn
+#
+# gunicorn reads this file from the working directory. The app is created
+# once in the master and forked into the workers; each worker drops the
+# pooled database connections and restarts the log listener it inherited
+# (see routing.RoutingSQLAlchemy and logs.setup_logging), so workers never
+# share a socket or a thread.
+#----------------------------------------------------------------------------#
+import multiprocessing
+import os
+
+# config.py reads these when the app is created
+os.environ.setdefault('FLASK_DEBUG', '0')
+os.environ.setdefault('TEMPLATE_WARMUP', '1')
+
+wsgi_app = 'app:create_app()'
+bind = '0.0.0.0:%s' % os.environ.get('PORT', '5000')
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# With more than one worker, the page cache needs PAGE_CACHE_REDIS_URL
+# (see cache.create_backend).
+os.environ['SERVER_PROCESSES'] = str(workers)
+# Threads per worker. With more than one, requests are served by gthread
+# workers; each thread holds at most one pooled connection, so keep
+# workers * threads within the database's connection limit.
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Import the app and compile the templates before forking, so workers share
+# those pages and start serving at once.
+preload_app = True
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then, at different times, to bound slow leaks.
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = '-'
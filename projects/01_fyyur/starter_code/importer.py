@@ -0,0 +1,270 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import csv
+import json
+import os
+import time
+from datetime import timedelta
+import click
+from flask.cli import AppGroup
+from werkzeug.datastructures import MultiDict
+from wtforms.validators import DataRequired
+from config import db
+from forms import VenueForm, ArtistForm, ShowForm
+from models import Artist, Venue, Show, Genre, ImportCheckpoint
+from booking import BookingChecker
+
+#----------------------------------------------------------------------------#
+# Readers.
+#----------------------------------------------------------------------------#
+
+# Yields the objects of a JSON array, or of newline separated JSON objects,
+# while holding at most one chunk of the file in memory.
+def iter_json(f, chunk_size=64 * 1024):
+  decoder = json.JSONDecoder()
+  buffer = ''
+  pos = 0
+  eof = False
+  while True:
+    # skip the opening bracket, whitespace and commas between records
+    while pos < len(buffer) and buffer[pos] in ' \t\r\n,[':
+      pos += 1
+    if pos < len(buffer) and buffer[pos] == ']':
+      return
+    if pos == len(buffer):
+      if eof:
+        return
+      buffer = f.read(chunk_size)
+      pos = 0
+      eof = not buffer
+      continue
+    try:
+      (record, end) = decoder.raw_decode(buffer, pos)
+    except ValueError:
+      if eof:
+        raise
+      chunk = f.read(chunk_size)
+      eof = not chunk
+      buffer = buffer[pos:] + chunk
+      pos = 0
+      continue
+    yield record
+    pos = end
+
+# Yields CSV rows as dicts. Genres are a comma separated list in one cell.
+def iter_csv(f):
+  for row in csv.DictReader(f):
+    if row.get('genres'):
+      row['genres'] = [g.strip() for g in row['genres'].split(',') if g.strip()]
+    yield row
+
+def iter_records(path, format=None):
+  format = format or ('csv' if path.endswith('.csv') else 'json')
+  with open(path, newline='' if format == 'csv' else None, encoding='utf-8') as f:
+    yield from (iter_csv(f) if format == 'csv' else iter_json(f))
+
+#----------------------------------------------------------------------------#
+# Validation.
+#----------------------------------------------------------------------------#
+
+def formdata(record):
+  data = MultiDict()
+  for (key, value) in record.items():
+    if value is None:
+      continue
+    if isinstance(value, list):
+      for v in value:
+        data.add(key, str(v))
+    elif isinstance(value, bool):
+      if value:
+        data.add(key, 'y')
+    else:
+      data.add(key, str(value))
+  return data
+
+# Validates a record with the same form the HTML pages use. Fields the form
+# does not require may be left out, even when they carry a format validator
+# such as URL(). Returns (form, errors).
+def validate(form_class, record):
+  form = form_class(formdata=formdata(record), meta={'csrf': False})
+  form.validate()
+  errors = {}
+  for (name, messages) in form.errors.items():
+    field = getattr(form, name)
+    required = any(isinstance(v, DataRequired) for v in field.validators)
+    if required or record.get(name) not in (None, '', []):
+      errors[name] = messages
+  return form, errors
+
+#----------------------------------------------------------------------------#
+# Row builders.
+#----------------------------------------------------------------------------#
+
+def venue_row(form, record):
+  return dict(
+    name = form.name.data, city = form.city.data, state = form.state.data, address = form.address.data,
+    phone = form.phone.data, genres = form.genres.data, image_link = form.image_link.data,
+    facebook_link = form.facebook_link.data, website = form.website.data,
+    seeking_talent = form.seeking_talent.data, seeking_description = form.seeking_description.data)
+
+def artist_row(form, record):
+  return dict(
+    name = form.name.data, city = form.city.data, state = form.state.data,
+    phone = form.phone.data, genres = form.genres.data, image_link = form.image_link.data,
+    facebook_link = form.facebook_link.data, website = form.website.data,
+    seeking_venue = form.seeking_venue.data, seeking_description = form.seeking_description.data)
+
+def show_row(form, record):
+  start_time = form.start_time.data
+  return dict(artist_id = record.get('artist_id'), venue_id = record.get('venue_id'), start_time = start_time, end_time = start_time + timedelta(minutes=form.duration.data))
+
+KINDS = {
+  'venues': (Venue, VenueForm, venue_row),
+  'artists': (Artist, ArtistForm, artist_row),
+  'shows': (Show, ShowForm, show_row),
+}
+
+#----------------------------------------------------------------------------#
+# Foreign keys.
+#----------------------------------------------------------------------------#
+
+# Replaces the genre names of a batch of venue or artist rows with Genre
+# objects, looked up with one query for the whole batch.
+def resolve_genres(rows):
+  genres = {g.name: g for g in Genre.lookup({n for row in rows for n in row['genres']})}
+  for row in rows:
+    row['genre_objects'] = [genres[n.strip()] for n in dict.fromkeys(row.pop('genres')) if n and n.strip()]
+
+# Resolves the artist and venue of a batch of show records with one query
+# per referenced table. Records may name their artist/venue by id
+# (artist_id, venue_id) or by name (artist_name, venue_name); resolved keys
+# are remembered across batches.
+class KeyResolver(object):
+  def __init__(self):
+    self.ids = {Artist: {}, Venue: {}}
+    self.names = {Artist: {}, Venue: {}}
+
+  def resolve(self, batch):
+    for (model, prefix) in ((Artist, 'artist'), (Venue, 'venue')):
+      ids = {int(r[prefix + '_id']) for (_, r, _) in batch if str(r.get(prefix + '_id') or '').isdigit()} - set(self.ids[model])
+      if ids:
+        found = {id for (id,) in db.session.query(model.id).filter(model.id.in_(ids), model.deleted_at.is_(None))}
+        self.ids[model].update((id, id in found) for id in ids)
+      names = {r[prefix + '_name'] for (_, r, _) in batch if r.get(prefix + '_name') and not r.get(prefix + '_id')} - set(self.names[model])
+      if names:
+        for (id, name) in db.session.query(model.id, model.name).filter(model.name.in_(names), model.deleted_at.is_(None)).order_by(model.id.desc()):
+          self.names[model][name] = id
+        self.names[model].update((name, None) for name in names if name not in self.names[model])
+
+    resolved = []
+    rejected = []
+    for (line, record, row) in batch:
+      errors = {}
+      for (model, prefix) in ((Artist, 'artist'), (Venue, 'venue')):
+        key = record.get(prefix + '_id')
+        if str(key or '').isdigit() and self.ids[model].get(int(key)):
+          row[prefix + '_id'] = int(key)
+        elif not key and self.names[model].get(record.get(prefix + '_name')):
+          row[prefix + '_id'] = self.names[model][record[prefix + '_name']]
+        else:
+          errors[prefix] = ['Unknown %s.' % prefix]
+      if errors:
+        rejected.append((line, record, errors))
+      else:
+        resolved.append((line, record, row))
+    return resolved, rejected
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+def batches(records, size):
+  batch = []
+  for (line, record) in records:
+    batch.append((line, record))
+    if len(batch) == size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+# Streams `path` into the table for `kind` in batches of `batch_size`. Each
+# batch is validated, has its foreign keys resolved, shows are checked for
+# double bookings, and the batch is inserted and commits together with the
+# import checkpoint, so an interrupted import resumes after the last
+# committed batch. Rejected records go to `rejects` as JSON lines. With
+# `dry_run` the whole file is validated the same way but nothing is
+# written. Returns (inserted, rejected), or (valid, rejected) for a dry run.
+def run_import(kind, path, format=None, batch_size=5000, resume=True, rejects=None, echo=print, dry_run=False):
+  (model, form_class, build) = KINDS[kind]
+  source = '%s:%s' % (kind, os.path.abspath(path))
+  checkpoint = db.session.query(ImportCheckpoint).get(source) if resume else None
+  if checkpoint is None:
+    checkpoint = ImportCheckpoint(source=source, position=0)
+  skip = checkpoint.position
+  resolver = KeyResolver() if kind == 'shows' else None
+  checker = BookingChecker() if kind == 'shows' else None
+
+  inserted = rejected = 0
+  started = time.monotonic()
+  records = ((line, record) for (line, record) in enumerate(iter_records(path, format), 1) if line > skip)
+  for (number, batch) in enumerate(batches(records, batch_size), 1):
+    valid = []
+    failed = []
+    for (line, record) in batch:
+      (form, errors) = validate(form_class, record)
+      if errors:
+        failed.append((line, record, errors))
+      else:
+        valid.append((line, record, build(form, record)))
+    if resolver:
+      (valid, unresolved) = resolver.resolve(valid)
+      failed.extend(unresolved)
+    if checker:
+      (valid, overlapping) = checker.check(valid)
+      failed.extend(overlapping)
+
+    # shows go in with one executemany; venues and artists need their new
+    # ids for the genre association rows, so they go through the ORM
+    if not dry_run:
+      if valid and model is Show:
+        db.session.execute(model.__table__.insert(), [row for (_, _, row) in valid])
+      elif valid:
+        rows = [row for (_, _, row) in valid]
+        resolve_genres(rows)
+        db.session.add_all(model(**row) for row in rows)
+      checkpoint.position = batch[-1][0]
+      db.session.merge(checkpoint)
+      db.session.commit()
+      if checker:
+        checker.committed()
+
+    if rejects is not None:
+      for (line, record, errors) in failed:
+        rejects.write(json.dumps(dict(line = line, record = record, errors = errors), default=str) + '\n')
+    inserted += len(valid)
+    rejected += len(failed)
+    elapsed = time.monotonic() - started
+    echo('%s: batch %d, line %d, %d %s, %d rejected, %.0f rows/s' % (kind, number, batch[-1][0], inserted, 'valid' if dry_run else 'inserted', rejected, (inserted + rejected) / elapsed if elapsed else 0))
+
+  return inserted, rejected
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+cli = AppGroup('fyyur', help='Fyyur maintenance commands.')
+
+@cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['json', 'csv']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--resume/--restart', default=True, show_default=True, help='Continue after the last committed batch of this file.')
+@click.option('--rejects', type=click.File('w'), help='Write rejected records here as JSON lines.')
+@click.option('--dry-run', is_flag=True, help='Only validate the file, including double bookings; write nothing.')
+def import_command(kind, path, format, batch_size, resume, rejects, dry_run):
+  """Bulk import venues, artists or shows from a JSON or CSV file."""
+  (inserted, rejected) = run_import(kind, path, format, batch_size, resume, rejects, echo=click.echo, dry_run=dry_run)
+  click.echo('%s: done, %d %s, %d rejected' % (kind, inserted, 'valid' if dry_run else 'inserted', rejected))
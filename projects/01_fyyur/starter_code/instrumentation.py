@@ -0,0 +1,105 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import time
+from contextlib import contextmanager
+from flask import g, request, has_request_context, current_app
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Query counting.
+#----------------------------------------------------------------------------#
+class QueryCounter(object):
+  def __init__(self):
+    self.count = 0
+    self.statements = []
+
+  def __call__(self, conn, cursor, statement, parameters, context, executemany):
+    self.count += 1
+    self.statements.append(statement)
+
+# Counts the SQL statements sent to the database inside the block, by every
+# engine unless one is given, e.g.
+#
+#   with count_queries() as queries:
+#     client.get('/venues')
+#   assert queries.count == 1
+@contextmanager
+def count_queries(engine=None):
+  engine = engine or Engine
+  counter = QueryCounter()
+  event.listen(engine, 'before_cursor_execute', counter)
+  try:
+    yield counter
+  finally:
+    event.remove(engine, 'before_cursor_execute', counter)
+
+#----------------------------------------------------------------------------#
+# Per-request timing.
+#----------------------------------------------------------------------------#
+
+# Every statement run while handling a request is added to that request's
+# g.sql_queries / g.sql_time. Listening on the Engine class covers every
+# engine the app creates.
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_query(conn, cursor, statement, parameters, context, executemany):
+  elapsed = time.perf_counter() - conn.info['query_started'].pop()
+  if has_request_context():
+    g.sql_queries = g.get('sql_queries', 0) + 1
+    g.sql_time = g.get('sql_time', 0.0) + elapsed
+    for listener in current_app.extensions.get('request_tracking', {}).get('queries', ()):
+      listener(statement, elapsed)
+
+# A statement that fails never reaches after_cursor_execute; its start time
+# would stay on the connection and be taken for the next statement's.
+@event.listens_for(Engine, 'handle_error')
+def fail_query(context):
+  if context.connection is not None:
+    started = context.connection.info.get('query_started')
+    if started:
+      started.pop()
+
+# Time spent rendering templates goes to g.render_time. Includes and parent
+# templates render inside the top level template, so they aren't counted
+# twice.
+class TimedTemplate(Template):
+  def render(self, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+      return super().render(*args, **kwargs)
+    finally:
+      if has_request_context():
+        g.render_time = g.get('render_time', 0.0) + time.perf_counter() - started
+
+# Returns the app's listeners: 'queries' are called with (statement,
+# seconds) for every statement run inside a request, 'requests' with
+# (endpoint, status, seconds, sql_queries, sql_time, render_time) at the end
+# of every request.
+def track_requests(app):
+  if 'request_tracking' in app.extensions:
+    return app.extensions['request_tracking']
+  listeners = app.extensions['request_tracking'] = dict(queries = [], requests = [])
+  app.jinja_env.template_class = TimedTemplate
+
+  @app.before_request
+  def start_request():
+    g.request_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_time = 0.0
+    g.render_time = 0.0
+
+  @app.after_request
+  def end_request(response):
+    if 'request_started' in g:
+      elapsed = time.perf_counter() - g.request_started
+      for listener in listeners['requests']:
+        listener(request.endpoint, response.status_code, elapsed, g.sql_queries, g.sql_time, g.render_time)
+    return response
+
+  return listeners
@@ -0,0 +1,94 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import atexit
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler, WatchedFileHandler
+from flask.logging import default_handler
+import instrumentation
+
+#----------------------------------------------------------------------------#
+# Logging.
+#----------------------------------------------------------------------------#
+
+# Attributes every LogRecord has; anything else was passed in `extra` and
+# goes into the JSON line as is.
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+  def format(self, record):
+    entry = dict(
+      time = datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+      level = record.levelname,
+      logger = record.name,
+      message = record.getMessage(),
+      where = f'{record.pathname}:{record.lineno}')
+    entry.update((k, v) for (k, v) in vars(record).items() if k not in STANDARD_ATTRIBUTES)
+    if record.exc_info:
+      entry['exception'] = self.formatException(record.exc_info)
+    return json.dumps(entry, default=str)
+
+# The listener is a thread of this process, so records are handed over as
+# they are instead of being flattened for pickling; only the message is
+# rendered up front, while its arguments are still current.
+class LocalQueueHandler(QueueHandler):
+  def prepare(self, record):
+    record.msg = record.getMessage()
+    record.args = None
+    return record
+
+# Rotating handlers only work for a single writer: with several processes,
+# each would rotate the file on its own and overwrite the others' backups.
+# Workers then append to LOG_FILE, reopening it when an external tool
+# (logrotate) has moved it away.
+def file_handler(config):
+  if config['SERVER_PROCESSES'] > 1:
+    return WatchedFileHandler(config['LOG_FILE'], delay=True)
+  if config['LOG_ROTATE_WHEN']:
+    return TimedRotatingFileHandler(config['LOG_FILE'], when=config['LOG_ROTATE_WHEN'], backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+  return RotatingFileHandler(config['LOG_FILE'], maxBytes=config['LOG_MAX_BYTES'], backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+
+# Request threads only put records on a queue; a background listener thread
+# formats them as JSON lines and writes them to the log file. Also
+# logs one record per request with its endpoint, status, latency, number of
+# SQL statements and render time, and sends the slow query log (see
+# metrics.py) to the same file. Returns the listener.
+def setup_logging(app):
+  records = queue.Queue(-1)
+  handler = file_handler(app.config)
+  handler.setFormatter(JsonFormatter())
+  listener = QueueListener(records, handler, respect_handler_level=True)
+  listener.start()
+  atexit.register(listener.stop)
+
+  queue_handler = LocalQueueHandler(records)
+  queue_handler.setLevel(logging.INFO)
+  app.logger.setLevel(logging.INFO)
+  app.logger.removeHandler(default_handler)
+  app.logger.addHandler(queue_handler)
+
+  requests = logging.getLogger('fyyur.requests')
+  requests.setLevel(logging.INFO)
+  requests.propagate = False
+  requests.addHandler(queue_handler)
+
+  slow_queries = logging.getLogger('fyyur.slow_queries')
+  slow_queries.propagate = False
+  slow_queries.addHandler(queue_handler)
+
+  def log_request(endpoint, status, seconds, sql_queries, sql_time, render_time):
+    requests.info('request', extra=dict(endpoint = endpoint, status = status, latency_ms = round(seconds * 1000, 3), sql_queries = sql_queries, sql_ms = round(sql_time * 1000, 3), render_ms = round(render_time * 1000, 3)))
+  instrumentation.track_requests(app)['requests'].append(log_request)
+
+  # The listener's thread doesn't survive a fork, and the queue's lock may
+  # be held by it at the time: a forked worker gets a new queue and thread.
+  def restart_listener():
+    queue_handler.queue = listener.queue = queue.Queue(-1)
+    listener._thread = None
+    listener.start()
+  os.register_at_fork(after_in_child=restart_listener)
+  return listener
@@ -0,0 +1,90 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import logging
+from bisect import bisect_left
+from threading import Lock
+from flask import request
+import instrumentation
+
+#----------------------------------------------------------------------------#
+# Histograms.
+#----------------------------------------------------------------------------#
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# Cumulative histogram per endpoint, rendered in the Prometheus text format.
+# Values are kept per worker process; Prometheus adds up the workers it
+# scrapes.
+class Histogram(object):
+  def __init__(self, name, help, buckets):
+    self.name = name
+    self.help = help
+    self.buckets = buckets
+    self.samples = {}
+    self.lock = Lock()
+
+  def observe(self, endpoint, value):
+    with self.lock:
+      sample = self.samples.get(endpoint)
+      if sample is None:
+        sample = self.samples[endpoint] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+      sample[0][bisect_left(self.buckets, value)] += 1
+      sample[1] += 1
+      sample[2] += value
+
+  def render(self):
+    lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+    with self.lock:
+      samples = sorted((endpoint, [list(counts), count, total]) for (endpoint, (counts, count, total)) in self.samples.items())
+    for (endpoint, (counts, count, total)) in samples:
+      label = f'endpoint="{escape(endpoint)}"'
+      cumulative = 0
+      for (bound, n) in zip(self.buckets, counts):
+        cumulative += n
+        lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+      lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+      lines.append(f'{self.name}_count{{{label}}} {count}')
+      lines.append(f'{self.name}_sum{{{label}}} {total}')
+    return '\n'.join(lines)
+
+def escape(value):
+  return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+request_seconds = Histogram('fyyur_request_seconds', 'Time to handle a request.', SECONDS_BUCKETS)
+sql_queries = Histogram('fyyur_request_sql_queries', 'SQL statements run per request.', QUERY_BUCKETS)
+sql_seconds = Histogram('fyyur_request_sql_seconds', 'Time spent in SQL statements per request.', SECONDS_BUCKETS)
+render_seconds = Histogram('fyyur_request_render_seconds', 'Time spent rendering templates per request.', SECONDS_BUCKETS)
+
+HISTOGRAMS = (request_seconds, sql_queries, sql_seconds, render_seconds)
+
+def render():
+  return '\n'.join(h.render() for h in HISTOGRAMS) + '\n'
+
+#----------------------------------------------------------------------------#
+# Collection.
+#----------------------------------------------------------------------------#
+
+slow_queries = logging.getLogger('fyyur.slow_queries')
+
+def observe_request(endpoint, status, seconds, queries, sql_time, render_time):
+  # unmatched urls have no endpoint; keep them out of the per-route series
+  endpoint = endpoint or 'unmatched'
+  request_seconds.observe(endpoint, seconds)
+  sql_queries.observe(endpoint, queries)
+  sql_seconds.observe(endpoint, sql_time)
+  render_seconds.observe(endpoint, render_time)
+
+# Records every request in the histograms. With SLOW_QUERY_SECONDS set, also
+# logs each statement that takes longer, with the route that ran it.
+def setup_metrics(app):
+  listeners = instrumentation.track_requests(app)
+  listeners['requests'].append(observe_request)
+
+  threshold = app.config.get('SLOW_QUERY_SECONDS')
+  if threshold is not None:
+    def log_slow_query(statement, seconds):
+      if seconds >= threshold:
+        slow_queries.warning('slow query', extra=dict(endpoint = request.endpoint, path = request.path, sql = statement, sql_ms = round(seconds * 1000, 3)))
+    listeners['queries'].append(log_slow_query)
@@ -0,0 +1,174 @@
+"""Baseline
+
+Brings a database at the last released revision, 006bacfe2be2, to the
+current schema in one step: keyset and calendar indexes, trigram search,
+row versions, import checkpoints, normalized genres, soft deletes and show
+durations. New databases don't replay the chain; `flask fyyur create-db`
+builds them at this revision directly (see schema.py).
+
+Revision ID: 3e1be94968ec
+Revises: 006bacfe2be2
+Create Date: 2026-10-18 23:40:12.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e1be94968ec'
+down_revision = '006bacfe2be2'
+branch_labels = None
+depends_on = None
+
+# genres::text works whether the column is a varchar or an array
+SEARCH_TEXT = """lower(concat_ws(' ', name, city, state, translate(genres::text, '{}",', '    ')))"""
+
+# Venue.genres is a varchar[] while Artist.genres was created as a varchar
+# holding an array literal; genres::text reads both as '{a,b,"c d"}'.
+GENRE_NAMES = """unnest(string_to_array(translate(genres::text, '{}', ''), ','))"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+
+    # 534588726441 declared Venue.name unique twice; 4dc3fb909992 only
+    # dropped the first of the two constraints
+    op.execute('ALTER TABLE "Venue" DROP CONSTRAINT IF EXISTS "Venue_name_key1"')
+
+    # search text, filled while the genre columns still exist
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_text', sa.String(), nullable=True))
+        op.execute(f'UPDATE "{table}" SET search_text = {SEARCH_TEXT}')
+        op.create_index('ix_%s_search_text' % table, table, ['search_text'], unique=False, postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+
+    op.create_table('ImportCheckpoint',
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('source')
+    )
+
+    # genres move from the Venue and Artist columns to association tables
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('VenueGenre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_VenueGenre_genre_id', 'VenueGenre', ['genre_id', 'venue_id'], unique=False)
+    op.create_table('ArtistGenre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_ArtistGenre_genre_id', 'ArtistGenre', ['genre_id', 'artist_id'], unique=False)
+
+    op.execute(f"""
+        INSERT INTO "Genre" (name)
+        SELECT DISTINCT btrim(name, ' "') FROM (
+            SELECT {GENRE_NAMES} AS name FROM "Venue"
+            UNION ALL
+            SELECT {GENRE_NAMES} AS name FROM "Artist"
+        ) AS names
+        WHERE btrim(name, ' "') <> ''
+    """)
+    for (table, association, key) in (('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id')):
+        op.execute(f"""
+            INSERT INTO "{association}" ({key}, genre_id)
+            SELECT DISTINCT entity.id, "Genre".id
+            FROM (SELECT id, {GENRE_NAMES} AS name FROM "{table}") AS entity
+            JOIN "Genre" ON "Genre".name = btrim(entity.name, ' "')
+        """)
+    op.drop_column('Venue', 'genres')
+    op.drop_column('Artist', 'genres')
+
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        op.create_index('ix_%s_live_name' % table, table, ['name', 'id'], unique=False, postgresql_where=sa.text('deleted_at IS NULL'))
+        op.create_index('ix_%s_deleted_at' % table, table, ['deleted_at'], unique=False, postgresql_where=sa.text('deleted_at IS NOT NULL'))
+
+    # Existing shows get the default two hours, cut short where the next
+    # show of the same venue or artist starts earlier, so the exclusion
+    # constraints below hold for them.
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute("""
+        UPDATE "Show" SET end_time = bounded.end_time
+        FROM (
+            SELECT id, LEAST(
+                start_time + interval '2 hours',
+                COALESCE(lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id), 'infinity'),
+                COALESCE(lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id), 'infinity')
+            ) AS end_time
+            FROM "Show"
+        ) AS bounded
+        WHERE "Show".id = bounded.id
+    """)
+    op.alter_column('Show', 'end_time', nullable=False)
+    op.create_check_constraint('ck_Show_end_time', 'Show', 'end_time >= start_time')
+    op.create_check_constraint('ck_Show_max_duration', 'Show', "end_time <= start_time + interval '86400 seconds'")
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_venue_id_excl" EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_artist_id_excl" EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)')
+
+    # keyset pagination, overlap probes (index-only with end_time) and the
+    # calendar counts
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+    op.create_index('ix_Show_start_time_venue_id', 'Show', ['start_time', 'venue_id'], unique=False)
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False, postgresql_include=['end_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False, postgresql_include=['end_time'])
+
+
+def downgrade():
+    for name in ('ix_Show_artist_id_start_time', 'ix_Show_venue_id_start_time', 'ix_Show_start_time_venue_id', 'ix_Show_start_time_id'):
+        op.drop_index(name, table_name='Show')
+    op.drop_constraint('Show_artist_id_excl', 'Show')
+    op.drop_constraint('Show_venue_id_excl', 'Show')
+    op.drop_constraint('ck_Show_max_duration', 'Show', type_='check')
+    op.drop_constraint('ck_Show_end_time', 'Show', type_='check')
+    op.drop_column('Show', 'end_time')
+
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_%s_deleted_at' % table, table_name=table)
+        op.drop_index('ix_%s_live_name' % table, table_name=table)
+        op.drop_column(table, 'deleted_at')
+
+    # back to the released column types: varchar[] on Venue, an array
+    # literal in a varchar on Artist
+    op.add_column('Venue', sa.Column('genres', sa.ARRAY(sa.String(length=120)), nullable=True))
+    op.add_column('Artist', sa.Column('genres', sa.String(length=120), nullable=True))
+    for (table, association, key, cast) in (('Venue', 'VenueGenre', 'venue_id', ''), ('Artist', 'ArtistGenre', 'artist_id', '::text')):
+        op.execute(f"""
+            UPDATE "{table}" SET genres = names.genres{cast}
+            FROM (
+                SELECT {key} AS id, array_agg("Genre".name ORDER BY "Genre".name) AS genres
+                FROM "{association}" JOIN "Genre" ON "Genre".id = "{association}".genre_id
+                GROUP BY {key}
+            ) AS names
+            WHERE "{table}".id = names.id
+        """)
+    op.drop_index('ix_ArtistGenre_genre_id', table_name='ArtistGenre')
+    op.drop_table('ArtistGenre')
+    op.drop_index('ix_VenueGenre_genre_id', table_name='VenueGenre')
+    op.drop_table('VenueGenre')
+    op.drop_table('Genre')
+
+    op.drop_table('ImportCheckpoint')
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'version')
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_%s_search_text' % table, table_name=table)
+        op.drop_column(table, 'search_text')
@@ -1,16 +1,78 @@
 #----------------------------------------------------------------------------#
 # Imports
 #----------------------------------------------------------------------------#
+from datetime import datetime, timedelta
+from sqlalchemy import event, DDL
 from config import db 
 
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Lowercased text that search matches against: the given values joined by
+# spaces. Lists, such as genre names, contribute each of their items.
+def search_document(*parts):
+  words = []
+  for part in parts:
+    if not part:
+      continue
+    if isinstance(part, (list, tuple)):
+      part = ' '.join(p for p in part if p)
+    words.append(str(part))
+  return ' '.join(' '.join(words).split()).lower()
+
+# On SQLite there is no pg_trgm, so each searchable table gets an FTS5 index
+# with the trigram tokenizer over its search_text column, kept in sync by
+# triggers.
+def sqlite_search_index(model, fts):
+  table = model.__tablename__
+  statements = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(search_text, content='{table}', content_rowid='id', tokenize='trigram')",
+    f'CREATE TRIGGER {fts}_ai AFTER INSERT ON "{table}" BEGIN INSERT INTO {fts}(rowid, search_text) VALUES (new.id, new.search_text); END',
+    f'CREATE TRIGGER {fts}_ad AFTER DELETE ON "{table}" BEGIN INSERT INTO {fts}({fts}, rowid, search_text) VALUES (\'delete\', old.id, old.search_text); END',
+    f'CREATE TRIGGER {fts}_au AFTER UPDATE ON "{table}" BEGIN INSERT INTO {fts}({fts}, rowid, search_text) VALUES (\'delete\', old.id, old.search_text); INSERT INTO {fts}(rowid, search_text) VALUES (new.id, new.search_text); END',
+  ]
+  for statement in statements:
+    event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+  event.listen(model.__table__, 'before_drop', DDL(f'DROP TABLE IF EXISTS {fts}').execute_if(dialect='sqlite'))
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
+class Genre(db.Model):
+  __tablename__ = 'Genre'
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(120), nullable=False, unique=True)
+
+  # The Genre rows for `names`, in order, creating the ones that don't
+  # exist yet.
+  @classmethod
+  def lookup(cls, names):
+    names = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+    found = {g.name: g for g in cls.query.filter(cls.name.in_(names))} if names else {}
+    return [found.get(name) or cls(name=name) for name in names]
+
+  def __repr__(self):
+    return f'<Genre {self.id} {self.name}>'
+
+# genre_id leads a second index so facet pages find a genre's venues and
+# artists without scanning
+venue_genres = db.Table('VenueGenre',
+  db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+  db.Index('ix_VenueGenre_genre_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table('ArtistGenre',
+  db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+  db.Index('ix_ArtistGenre_genre_id', 'genre_id', 'artist_id'),
+)
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=True)
-    genres = db.Column(db.ARRAY(db.String(120)), nullable=True, default=[])
     address = db.Column(db.String(120), nullable=True)
     city = db.Column(db.String(120), nullable=True)
     state = db.Column(db.String(120), nullable=True)
@@ -20,8 +82,30 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean())
     seeking_description = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
+    search_text = db.Column(db.String)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=db.func.now())
+    deleted_at = db.Column(db.DateTime)
 
     venue_shows = db.relationship('Show', backref='Venue', lazy=True)
+    genre_objects = db.relationship('Genre', secondary=venue_genres, lazy=True, order_by=Genre.name)
+
+    __table_args__ = (
+      db.Index('ix_Venue_search_text', 'search_text', postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+      # listings only read live rows; the purge only reads deleted ones
+      db.Index('ix_Venue_live_name', 'name', 'id', postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)),
+      db.Index('ix_Venue_deleted_at', 'deleted_at', postgresql_where=deleted_at.isnot(None), sqlite_where=deleted_at.isnot(None)),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+    # genre names, stored in the VenueGenre association table
+    @property
+    def genres(self):
+      return [g.name for g in self.genre_objects]
+
+    @genres.setter
+    def genres(self, names):
+      self.genre_objects = Genre.lookup(names)
    
     def __repr__(self):
       return f'<Venue {self.id} {self.name}>'
@@ -36,12 +120,41 @@ class Artist(db.Model):
     phone = db.Column(db.String(120))
     website = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String(120)), nullable=True, default=[])
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(200))
+    search_text = db.Column(db.String)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=db.func.now())
+    deleted_at = db.Column(db.DateTime)
 
     artist_shows = db.relationship('Show', backref='Artist', lazy=True)
+    genre_objects = db.relationship('Genre', secondary=artist_genres, lazy=True, order_by=Genre.name)
+
+    __table_args__ = (
+      db.Index('ix_Artist_search_text', 'search_text', postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+      db.Index('ix_Artist_live_name', 'name', 'id', postgresql_where=deleted_at.is_(None), sqlite_where=deleted_at.is_(None)),
+      db.Index('ix_Artist_deleted_at', 'deleted_at', postgresql_where=deleted_at.isnot(None), sqlite_where=deleted_at.isnot(None)),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+    # genre names, stored in the ArtistGenre association table
+    @property
+    def genres(self):
+      return [g.name for g in self.genre_objects]
+
+    @genres.setter
+    def genres(self, names):
+      self.genre_objects = Genre.lookup(names)
+
+# Shows last SHOW_DURATION unless booked otherwise, and never longer than
+# MAX_SHOW_DURATION, so only shows starting less than MAX_SHOW_DURATION
+# before a booking can overlap it (see booking.py).
+SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+def default_end_time(context):
+  return context.get_current_parameters()['start_time'] + SHOW_DURATION
 
 class Show(db.Model):
   __tablename__ = 'Show'
@@ -49,6 +162,57 @@ class Show(db.Model):
   venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
   start_time = db.Column(db.DateTime, nullable=False)
+  end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+  version = db.Column(db.Integer, nullable=False, server_default='1')
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=db.func.now())
+
+  # keyset pagination of /shows walks (start_time, id); the overlap checks
+  # probe a venue's or an artist's shows by start_time, and the calendar
+  # counts shows per venue in a start_time range, all without reading the
+  # table itself on Postgres
+  __table_args__ = (
+    db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    db.Index('ix_Show_start_time_venue_id', 'start_time', 'venue_id'),
+    db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time', postgresql_include=['end_time']),
+    db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time', postgresql_include=['end_time']),
+    db.CheckConstraint('end_time >= start_time', name='ck_Show_end_time'),
+  )
+  __mapper_args__ = {'version_id_col': version}
 
   def __repr__(self):
     return f'<Show {self.venue_id} {self.artist_id}>'
+
+# How far `flask fyyur import` got through a file, committed together with
+# each batch so an interrupted import can resume.
+class ImportCheckpoint(db.Model):
+  __tablename__ = 'ImportCheckpoint'
+  source = db.Column(db.String, primary_key=True)
+  position = db.Column(db.Integer, nullable=False, default=0)
+
+@event.listens_for(Venue, 'before_insert')
+@event.listens_for(Venue, 'before_update')
+def index_venue(mapper, connection, venue):
+  venue.search_text = search_document(venue.name, venue.city, venue.state, venue.genres)
+
+@event.listens_for(Artist, 'before_insert')
+@event.listens_for(Artist, 'before_update')
+def index_artist(mapper, connection, artist):
+  artist.search_text = search_document(artist.name, artist.city, artist.state, artist.genres)
+
+sqlite_search_index(Venue, 'venue_search')
+sqlite_search_index(Artist, 'artist_search')
+
+# On Postgres no venue or artist can be double booked even by concurrent
+# requests: exclusion constraints reject overlapping (start_time, end_time)
+# ranges per venue and per artist.
+def postgres_booking_constraints():
+  statements = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    'ALTER TABLE "Show" ADD CONSTRAINT "Show_venue_id_excl" EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)',
+    'ALTER TABLE "Show" ADD CONSTRAINT "Show_artist_id_excl" EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)',
+    'ALTER TABLE "Show" ADD CONSTRAINT "ck_Show_max_duration" CHECK (end_time <= start_time + interval \'%d seconds\')' % MAX_SHOW_DURATION.total_seconds(),
+  ]
+  for statement in statements:
+    event.listen(Show.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+postgres_booking_constraints()
@@ -0,0 +1,96 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import threading
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, select
+from config import db
+from models import Artist, Venue, Show, venue_genres, artist_genres
+
+#----------------------------------------------------------------------------#
+# Purge.
+#----------------------------------------------------------------------------#
+
+# (model, foreign key of its shows, its genre association table and column)
+PURGED = (
+  (Venue, Show.venue_id, venue_genres, venue_genres.c.venue_id),
+  (Artist, Show.artist_id, artist_genres, artist_genres.c.artist_id),
+)
+
+# Removes soft-deleted venues and artists for good. Their shows go first,
+# `batch_size` at a time with a commit after each batch, so no statement
+# holds many row locks for long; then the rows themselves, once nothing
+# references them any more. Returns the number of (shows, rows) removed.
+def purge_deleted(batch_size=1000):
+  shows = rows = 0
+  for (model, show_fk, association, association_fk) in PURGED:
+    deleted = select(model.id).where(model.deleted_at.isnot(None))
+    while True:
+      batch = select(Show.id).where(show_fk.in_(deleted)).limit(batch_size)
+      removed = db.session.execute(delete(Show).where(Show.id.in_(batch)).execution_options(synchronize_session=False)).rowcount
+      db.session.commit()
+      shows += removed
+      if removed < batch_size:
+        break
+
+    while True:
+      ids = [id for (id,) in db.session.execute(deleted.where(~select(Show.id).where(show_fk == model.id).exists()).limit(batch_size))]
+      if not ids:
+        break
+      db.session.execute(delete(association).where(association_fk.in_(ids)))
+      db.session.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+      db.session.commit()
+      rows += len(ids)
+      if len(ids) < batch_size:
+        break
+  return shows, rows
+
+# Runs purge_deleted on a daemon thread of this process whenever it is
+# woken, so delete requests return as soon as the row is marked deleted.
+# Wakes that arrive during a purge are folded into one more run.
+#
+# The thread purges the database of the app that woke it. Threads don't
+# survive a fork; a forked worker starts its own on its first wake.
+class Purger(object):
+  def __init__(self):
+    self.app = None
+    self.pending = threading.Event()
+    self.thread = None
+    self.lock = threading.Lock()
+
+  def wake(self):
+    if not current_app.config['PURGE_IN_BACKGROUND']:
+      return
+    with self.lock:
+      self.app = current_app._get_current_object()
+      if self.thread is None or not self.thread.is_alive():
+        self.thread = threading.Thread(target=self.run, name='fyyur-purge', daemon=True)
+        self.thread.start()
+    self.pending.set()
+
+  def run(self):
+    while True:
+      self.pending.wait()
+      self.pending.clear()
+      with self.app.app_context():
+        try:
+          purge_deleted(self.app.config['PURGE_BATCH_SIZE'])
+        except Exception:
+          db.session.rollback()
+          self.app.logger.exception('purge failed')
+        finally:
+          db.session.remove()
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+@click.command('purge')
+@with_appcontext
+@click.option('--batch-size', default=1000, show_default=True)
+def purge_command(batch_size):
+  """Remove soft-deleted venues and artists and their shows."""
+  (shows, rows) = purge_deleted(batch_size)
+  click.echo('purged %d venues/artists and %d shows' % (rows, shows))
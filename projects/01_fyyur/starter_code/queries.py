@@ -0,0 +1,260 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from datetime import datetime
+from sqlalchemy import func, tuple_, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from config import db
+from models import Artist, Venue, Show, venue_genres, artist_genres, MAX_SHOW_DURATION
+
+SHOWS_PER_PAGE = 30
+
+#----------------------------------------------------------------------------#
+# Show counts
+#----------------------------------------------------------------------------#
+
+# COUNT(*) FILTER (WHERE condition). Databases without aggregate FILTER
+# (SQLite before 3.30, MySQL) get the equivalent
+# COUNT(CASE WHEN condition THEN 1 END).
+class count_where(FunctionElement):
+  type = Integer()
+  name = 'count_where'
+  inherit_cache = True
+
+@compiles(count_where)
+def compile_count_case(element, compiler, **kw):
+  (condition,) = element.clauses
+  return 'COUNT(CASE WHEN %s THEN 1 END)' % compiler.process(condition, **kw)
+
+@compiles(count_where, 'postgresql')
+@compiles(count_where, 'sqlite')
+def compile_count_filter(element, compiler, **kw):
+  if compiler.dialect.name == 'sqlite' and (compiler.dialect.server_version_info or ()) < (3, 30):
+    return compile_count_case(element, compiler, **kw)
+  (condition,) = element.clauses
+  return 'COUNT(*) FILTER (WHERE %s)' % compiler.process(condition, **kw)
+
+# show foreign key, counterpart model and counterpart foreign key per side
+COUNTED = dict(
+  venue = (Show.venue_id, Artist, Show.artist_id),
+  artist = (Show.artist_id, Venue, Show.venue_id))
+
+NO_SHOWS = (0, 0)
+
+# (id, num_upcoming_shows, num_past_shows) of every venue or artist with
+# shows, in one pass over their shows. Shows whose venue or artist was
+# deleted aren't counted, as on the detail pages.
+def show_counts_query(side, now):
+  (fk, counterpart, counterpart_fk) = COUNTED[side]
+  return db.session.query(
+      fk.label('id'),
+      count_where(Show.start_time > now).label('num_upcoming_shows'),
+      count_where(Show.start_time <= now).label('num_past_shows')
+    ) \
+    .join(counterpart, counterpart.id == counterpart_fk) \
+    .filter(counterpart.deleted_at.is_(None)) \
+    .group_by(fk)
+
+# Upcoming and past show counts of the given venue or artist ids in one
+# statement, as {id: (num_upcoming_shows, num_past_shows)}. Ids without
+# shows are missing; they count NO_SHOWS.
+def show_counts(side, ids, now):
+  if not ids:
+    return {}
+  (fk, _, _) = COUNTED[side]
+  rows = show_counts_query(side, now).filter(fk.in_(ids))
+  return {row.id: (row.num_upcoming_shows, row.num_past_shows) for row in rows}
+
+# All live venues or artists with their upcoming and past show counts, in a
+# single statement, ordered by name.
+def listing(model, side, now):
+  counts = show_counts_query(side, now).subquery()
+  return db.session.query(
+      model.id,
+      model.name,
+      model.city,
+      model.state,
+      func.coalesce(counts.c.num_upcoming_shows, 0).label('num_upcoming_shows'),
+      func.coalesce(counts.c.num_past_shows, 0).label('num_past_shows')
+    ) \
+    .outerjoin(counts, counts.c.id == model.id) \
+    .filter(model.deleted_at.is_(None)) \
+    .order_by(model.name, model.id) \
+    .all()
+
+#----------------------------------------------------------------------------#
+# Venues
+#----------------------------------------------------------------------------#
+
+# All venues with their show counts. Like every query here, it skips
+# soft-deleted venues and artists. See areas.group_by_area for grouping
+# them by city/state.
+def venue_listing(now):
+  return listing(Venue, 'venue', now)
+
+#----------------------------------------------------------------------------#
+# Artists
+#----------------------------------------------------------------------------#
+
+def artist_listing(now):
+  return listing(Artist, 'artist', now)
+
+#----------------------------------------------------------------------------#
+# Shows
+#----------------------------------------------------------------------------#
+
+# Both past and upcoming shows of a venue in one joined statement. `now` is
+# the single reference timestamp the `upcoming` flag is computed against.
+def venue_shows(venue_id, now):
+  return db.session.query(
+      Show.start_time,
+      Artist.id.label('artist_id'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'),
+      (Show.start_time > now).label('upcoming')
+    ) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .filter(Show.venue_id == venue_id, Artist.deleted_at.is_(None)) \
+    .order_by(Show.start_time) \
+    .all()
+
+# Both past and upcoming shows of an artist in one joined statement.
+def artist_shows(artist_id, now):
+  return db.session.query(
+      Show.start_time,
+      Venue.id.label('venue_id'),
+      Venue.name.label('venue_name'),
+      Venue.image_link.label('venue_image_link'),
+      (Show.start_time > now).label('upcoming')
+    ) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .filter(Show.artist_id == artist_id, Venue.deleted_at.is_(None)) \
+    .order_by(Show.start_time) \
+    .all()
+
+# One page of shows ordered by (start_time, id), starting after the
+# (start_time, id) cursor `after`. Only upcoming shows are listed unless
+# `since` is None. Fetches one extra row so callers can tell whether a next
+# page exists without counting the table.
+def show_page(after=None, since=None, per_page=SHOWS_PER_PAGE):
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Venue.id.label('venue_id'),
+      Venue.name.label('venue_name'),
+      Artist.id.label('artist_id'),
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')
+    ) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .filter(Venue.deleted_at.is_(None), Artist.deleted_at.is_(None))
+  if since is not None:
+    query = query.filter(Show.start_time > since)
+  if after is not None:
+    query = query.filter(tuple_(Show.start_time, Show.id) > tuple_(*after))
+  rows = query.order_by(Show.start_time, Show.id).limit(per_page + 1).all()
+
+  next_cursor = None
+  if len(rows) > per_page:
+    rows = rows[:per_page]
+    next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+  return rows, next_cursor
+
+# Cursors are '<iso start_time>,<id>' so they stay readable in URLs.
+def encode_cursor(start_time, show_id):
+  return f'{start_time.isoformat()},{show_id}'
+
+def decode_cursor(cursor):
+  try:
+    start_time, show_id = cursor.rsplit(',', 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+  except (AttributeError, ValueError):
+    return None
+
+#----------------------------------------------------------------------------#
+# Calendar
+#----------------------------------------------------------------------------#
+
+# Number of shows per day and city starting in [start, end), counted in
+# SQL. Only start_time and venue_id of Show are read, which the
+# (start_time, venue_id) index covers on its own.
+def shows_per_day(start, end, city=None, state=None):
+  day = func.date(Show.start_time).label('day')
+  query = db.session.query(day, Venue.city, Venue.state, func.count().label('num_shows')) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .filter(Show.start_time >= start, Show.start_time < end, Venue.deleted_at.is_(None))
+  if city:
+    query = query.filter(Venue.city == city)
+  if state:
+    query = query.filter(Venue.state == state)
+  return query \
+    .group_by(day, Venue.city, Venue.state) \
+    .order_by(day, Venue.state, Venue.city) \
+    .all()
+
+# Venues of a city without any show overlapping [start, end). Each venue is
+# one probe of the (venue_id, start_time) index, which also carries
+# end_time on Postgres, as in booking.conflicts.
+def free_venues(start, end, city, state=None):
+  busy = db.session.query(Show.venue_id) \
+    .filter(Show.venue_id == Venue.id, Show.start_time > start - MAX_SHOW_DURATION, Show.start_time < end, Show.end_time > start) \
+    .exists()
+  query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address) \
+    .filter(Venue.city == city, Venue.deleted_at.is_(None), ~busy)
+  if state:
+    query = query.filter(Venue.state == state)
+  return query.order_by(Venue.name, Venue.id).all()
+
+#----------------------------------------------------------------------------#
+# Genres
+#----------------------------------------------------------------------------#
+
+# Venues and artists of a genre, read through the (genre_id, ...) index of
+# the association tables.
+def genre_venues(genre_id):
+  return db.session.query(Venue.id, Venue.name, Venue.city, Venue.state) \
+    .join(venue_genres, venue_genres.c.venue_id == Venue.id) \
+    .filter(venue_genres.c.genre_id == genre_id, Venue.deleted_at.is_(None)) \
+    .order_by(Venue.name) \
+    .all()
+
+def genre_artists(genre_id):
+  return db.session.query(Artist.id, Artist.name, Artist.city, Artist.state) \
+    .join(artist_genres, artist_genres.c.artist_id == Artist.id) \
+    .filter(artist_genres.c.genre_id == genre_id, Artist.deleted_at.is_(None)) \
+    .order_by(Artist.name) \
+    .all()
+
+#----------------------------------------------------------------------------#
+# Versions
+#----------------------------------------------------------------------------#
+
+# Everything a venue page depends on, in one aggregate: the venue's own
+# version, the number and summed versions of its shows and of the artists
+# playing them, how many shows are still upcoming at `now`, and the latest
+# update among all of them. Any write that changes the page changes one of
+# these values. None if there is no such venue, or it was deleted.
+def venue_version(venue_id, now):
+  return entity_version(Venue, Show.venue_id, Artist, Show.artist_id, venue_id, now)
+
+def artist_version(artist_id, now):
+  return entity_version(Artist, Show.artist_id, Venue, Show.venue_id, artist_id, now)
+
+def entity_version(model, show_fk, counterpart, counterpart_fk, id, now):
+  return db.session.query(
+      model.version,
+      model.updated_at,
+      func.count(Show.id).label('num_shows'),
+      count_where(Show.start_time > now).label('num_upcoming_shows'),
+      func.coalesce(func.sum(Show.version), 0).label('shows_version'),
+      func.coalesce(func.sum(counterpart.version), 0).label('counterparts_version'),
+      func.max(Show.updated_at).label('shows_updated_at'),
+      func.max(counterpart.updated_at).label('counterparts_updated_at')
+    ) \
+    .outerjoin(Show, show_fk == model.id) \
+    .outerjoin(counterpart, counterpart.id == counterpart_fk) \
+    .filter(model.id == id, model.deleted_at.is_(None)) \
+    .group_by(model.id) \
+    .first()
@@ -0,0 +1,90 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import os
+import time
+from flask import request, session as cookie, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+
+#----------------------------------------------------------------------------#
+# Engines.
+#----------------------------------------------------------------------------#
+
+# Pool and timeout settings for one engine, from the DB_* config values.
+# SQLite connections are cheap to open and Flask-SQLAlchemy gives file
+# databases a NullPool, so only the settings every pool takes apply there.
+def engine_options(config, sa_url):
+  options = dict(pool_pre_ping = config['DB_POOL_PRE_PING'], pool_recycle = config['DB_POOL_RECYCLE'])
+  if sa_url.get_backend_name() == 'sqlite':
+    return options
+  options.update(pool_size = config['DB_POOL_SIZE'], max_overflow = config['DB_MAX_OVERFLOW'], pool_timeout = config['DB_POOL_TIMEOUT'])
+  if sa_url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT']:
+    options['connect_args'] = dict(options = '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT'])
+  return options
+
+#----------------------------------------------------------------------------#
+# Read/write routing.
+#----------------------------------------------------------------------------#
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# RoutingSession and RoutingSQLAlchemy extend Flask-SQLAlchemy 2.x
+# (SignallingSession, apply_driver_hacks), which 3.0 removed; requirements.txt
+# keeps it below 3.
+#
+# Reads made while handling a GET go to the 'replica' bind, if one is
+# configured. Everything else (the *_submission handlers, delete_venue, the
+# command line, and any flush) uses the primary.
+#
+# A client that has just written keeps reading from the primary for
+# REPLICA_STICKY_SECONDS, so the page it is redirected to shows its own
+# change even while the replica lags behind.
+def reads_from_replica(app):
+  return (
+    'replica' in (app.config['SQLALCHEMY_BINDS'] or {})
+    and has_request_context()
+    and request.method in READ_METHODS
+    and not sticks_to_primary())
+
+# Whether the current client wrote within REPLICA_STICKY_SECONDS. Cached
+# pages may have been rendered from the lagging replica after its write
+# invalidated them, so @pages.cached bypasses the cache for it too.
+def sticks_to_primary():
+  return cookie.get('primary_until', 0) >= time.time()
+
+class RoutingSession(SignallingSession):
+  def __init__(self, db, **options):
+    self.db = db
+    SignallingSession.__init__(self, db, **options)
+
+  def get_bind(self, mapper=None, clause=None):
+    if self._flushing or not reads_from_replica(self.app):
+      return SignallingSession.get_bind(self, mapper, clause)
+    return self.db.get_engine(self.app, bind='replica')
+
+class RoutingSQLAlchemy(SQLAlchemy):
+  def init_app(self, app):
+    SQLAlchemy.init_app(self, app)
+    os.register_at_fork(after_in_child=lambda: self.dispose_engines(app))
+
+    @app.after_request
+    def stick_to_primary(response):
+      if request.method not in READ_METHODS and 'replica' in (app.config['SQLALCHEMY_BINDS'] or {}):
+        cookie['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+      return response
+
+  # A forked process must not use the pooled connections it inherited: they
+  # are the parent's sockets. Each engine forgets them without closing them
+  # (which would close them for the parent too) and opens its own.
+  def dispose_engines(self, app):
+    for connector in self.get_app(app).extensions['sqlalchemy'].connectors.values():
+      if connector._engine is not None:
+        connector._engine.dispose(close=False)
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+  def apply_driver_hacks(self, app, sa_url, options):
+    options.update(engine_options(app.config, sa_url))
+    return SQLAlchemy.apply_driver_hacks(self, app, sa_url, options)
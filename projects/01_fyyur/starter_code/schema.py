@@ -0,0 +1,159 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import click
+import flask_migrate
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask.cli import with_appcontext
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from config import db, basedir
+
+#----------------------------------------------------------------------------#
+# Baseline.
+#----------------------------------------------------------------------------#
+
+# The released migrations end at RELEASED_HEAD, and BASELINE upgrades a
+# database from there to the current schema. The released chain can't
+# build an empty database (several of its revisions create the same
+# tables), so a new database is created from the models and stamped at the
+# head instead.
+BASELINE = '3e1be94968ec'
+RELEASED_HEAD = '006bacfe2be2'
+
+# Creates the tables of an empty database and records the head revision.
+def create_schema():
+  with db.engine.begin() as connection:
+    if connection.dialect.name == 'postgresql':
+      # the search indexes use its trigram operator class
+      connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+  db.create_all()
+  flask_migrate.stamp()
+
+# What autogenerate would change to make the database match the models.
+def schema_differences(connection):
+  diff = compare_metadata(MigrationContext.configure(connection), db.metadata)
+  # SQLite's FTS5 search tables aren't in the metadata
+  return [d for d in diff if not (d[0] == 'remove_table' and d[1].name not in db.metadata.tables)]
+
+# Records BASELINE for a database whose tables were created without the
+# migrations (by db.create_all()) and returns the revisions it recorded
+# before, none. Raises ValueError unless its schema is the baseline's, and
+# for a database that records another revision, which `flask db upgrade`
+# moves on instead.
+def stamp_baseline(connection):
+  if inspect(connection).has_table('alembic_version'):
+    versions = [version for (version,) in connection.execute(text('SELECT version_num FROM alembic_version'))]
+    if versions != [BASELINE]:
+      raise ValueError(f'the database is at {", ".join(versions) or "no revision"}; upgrade it with `flask db upgrade`')
+    return versions
+  differences = schema_differences(connection)
+  if differences:
+    raise ValueError('the schema differs from the baseline:\n' + '\n'.join(str(d) for d in differences))
+  connection.execute(text('CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL, CONSTRAINT alembic_version_pkc PRIMARY KEY (version_num))'))
+  connection.execute(text('INSERT INTO alembic_version VALUES (:baseline)'), dict(baseline = BASELINE))
+  return []
+
+@click.command('create-db')
+@with_appcontext
+def create_db_command():
+  """Create the tables of an empty database at the latest revision."""
+  if inspect(db.engine).get_table_names():
+    raise click.ClickException('the database is not empty; upgrade it with `flask db upgrade`')
+  create_schema()
+  click.echo(f'created the schema at {BASELINE}')
+
+@click.command('stamp-baseline')
+@with_appcontext
+def stamp_baseline_command():
+  """Record the baseline revision for a database created without the migrations."""
+  with db.engine.begin() as connection:
+    try:
+      versions = stamp_baseline(connection)
+    except ValueError as e:
+      raise click.ClickException(str(e))
+  if versions:
+    click.echo(f'nothing to do: the database is at {", ".join(versions)}')
+  else:
+    click.echo(f'stamped {BASELINE}')
+
+#----------------------------------------------------------------------------#
+# Snapshots.
+#
+# Test and benchmark databases are built (created, then seeded) once and
+# kept as a template; every later database is a copy of the template: a
+# file copy on SQLite, CREATE DATABASE ... TEMPLATE on Postgres. Templates
+# are named after a hash of the models, the migrations and whatever else the
+# caller says went into them, so a schema change or new seed data builds a
+# new one.
+#----------------------------------------------------------------------------#
+
+MIGRATIONS = os.path.join(basedir, 'migrations', 'versions')
+MODELS = os.path.join(basedir, 'models.py')
+SNAPSHOT_DIR = os.environ.get('FYYUR_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'fyyur-snapshots'))
+
+def snapshot_key(*parts):
+  digest = hashlib.sha256()
+  for path in [MODELS] + sorted(glob.glob(os.path.join(MIGRATIONS, '*.py'))):
+    with open(path, 'rb') as f:
+      digest.update(f.read())
+  for part in parts:
+    digest.update(repr(part).encode('utf-8'))
+  return digest.hexdigest()[:16]
+
+# Makes the database at `url` a copy of the template `key`, dropping what
+# was there. A missing template is built first by calling build(url) with
+# the URL of an empty database; build must close its connections before it
+# returns. Returns whether the template was built.
+def clone_database(url, key, build):
+  url = make_url(url)
+  backend = url.get_backend_name()
+  if backend == 'sqlite':
+    return clone_sqlite(url, key, build)
+  if backend == 'postgresql':
+    return clone_postgres(url, key, build)
+  raise ValueError(f'{backend} databases cannot be cloned')
+
+def clone_sqlite(url, key, build):
+  os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+  template = os.path.join(SNAPSHOT_DIR, f'fyyur-{key}.db')
+  built = not os.path.exists(template)
+  if built:
+    # built under a temporary name, so a concurrent run never copies a
+    # half-built template
+    (fd, building) = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix='.db')
+    os.close(fd)
+    try:
+      build(url.set(database=building).render_as_string(hide_password=False))
+      os.replace(building, template)
+    except BaseException:
+      os.remove(building)
+      raise
+  shutil.copyfile(template, url.database)
+  return built
+
+# Needs a role that may create databases. The template is cloned at the
+# speed of a file copy, with no statement replayed.
+def clone_postgres(url, key, build):
+  template = f'{url.database}_template_{key}'
+  engine = create_engine(url.set(database='postgres'), isolation_level='AUTOCOMMIT')
+  try:
+    with engine.connect() as connection:
+      built = not connection.execute(text('SELECT 1 FROM pg_database WHERE datname = :name'), dict(name = template)).scalar()
+      if built:
+        building = template + '_building'
+        connection.execute(text(f'DROP DATABASE IF EXISTS "{building}"'))
+        connection.execute(text(f'CREATE DATABASE "{building}"'))
+        build(url.set(database=building).render_as_string(hide_password=False))
+        connection.execute(text(f'ALTER DATABASE "{building}" RENAME TO "{template}"'))
+      connection.execute(text(f'DROP DATABASE IF EXISTS "{url.database}"'))
+      connection.execute(text(f'CREATE DATABASE "{url.database}" TEMPLATE "{template}"'))
+  finally:
+    engine.dispose()
+  return built
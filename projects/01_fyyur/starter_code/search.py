@@ -0,0 +1,45 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from sqlalchemy import func, literal_column, table, column
+from config import db
+from models import Artist, Venue, search_document
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Venues whose name, city, state or genres contain the search term, best
+# matches first. See queries.show_counts for their number of shows.
+def search_venues(term):
+  return search(Venue, 'venue_search', term)
+
+# Artists whose name, city, state or genres contain the search term.
+def search_artists(term):
+  return search(Artist, 'artist_search', term)
+
+# Matches `term` as a substring of model.search_text and returns (id, name)
+# rows in a single statement. On Postgres the LIKE is served by the pg_trgm
+# GIN index and hits are ranked by name similarity; on SQLite terms of
+# three or more characters go through the FTS5 trigram index and are ranked
+# by bm25.
+def search(model, fts, term):
+  term = search_document(term)
+  query = db.session.query(model.id, model.name) \
+    .filter(model.deleted_at.is_(None))
+
+  dialect = db.engine.dialect.name
+  if dialect == 'sqlite' and len(term) >= 3:
+    index = table(fts, column('rowid'), column('rank'))
+    phrase = '"' + term.replace('"', '""') + '"'
+    return query \
+      .join(index, index.c.rowid == model.id) \
+      .filter(literal_column(fts).op('MATCH')(phrase)) \
+      .order_by(index.c.rank, model.name) \
+      .all()
+
+  pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+  query = query.filter(model.search_text.like(pattern, escape='\\'))
+  if dialect == 'postgresql':
+    return query.order_by(func.similarity(model.name, term).desc(), model.name).all()
+  return query.order_by(model.name).all()
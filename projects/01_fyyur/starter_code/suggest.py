@@ -0,0 +1,128 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import os
+import time
+from bisect import bisect_left, insort
+from threading import Lock
+from sqlalchemy.exc import SQLAlchemyError
+from config import db
+from models import Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Prefix index.
+#----------------------------------------------------------------------------#
+
+# In-process typeahead index over artist and venue names. Every word of a
+# name is a key, so "hop" finds "The Musical Hop". Keys live in one sorted
+# list and a prefix lookup is a bisect followed by a short forward scan.
+#
+# Each worker process holds its own copy: it is built from the database on
+# startup and kept current by the create/edit/delete handlers of that
+# worker. Names added by other workers only show up once it is rebuilt,
+# see refresh_index.
+class PrefixIndex(object):
+  def __init__(self):
+    self.keys = []
+    self.names = {}
+    self.built = None
+    self.lock = Lock()
+
+  def __len__(self):
+    return len(self.names)
+
+  # Seconds since the last rebuild; infinite after expire().
+  def age(self):
+    return float('inf') if self.built is None else time.monotonic() - self.built
+
+  def expire(self):
+    self.built = None
+
+  def rebuild(self, entries):
+    keys = []
+    names = {}
+    for (kind, id, name) in entries:
+      names[(kind, id)] = name
+      keys.extend(self._keys(kind, id, name))
+    keys.sort()
+    with self.lock:
+      self.keys = keys
+      self.names = names
+      self.built = time.monotonic()
+
+  def add(self, kind, id, name):
+    with self.lock:
+      self._remove(kind, id)
+      self.names[(kind, id)] = name
+      for key in self._keys(kind, id, name):
+        insort(self.keys, key)
+
+  def remove(self, kind, id):
+    with self.lock:
+      self._remove(kind, id)
+
+  # Up to `limit` distinct entries with a word starting with `prefix`, as
+  # dicts ready for JSON.
+  def suggest(self, prefix, limit=10):
+    prefix = ' '.join(prefix.lower().split())
+    if not prefix:
+      return []
+    results = []
+    seen = set()
+    with self.lock:
+      i = bisect_left(self.keys, (prefix,))
+      while i < len(self.keys) and len(results) < limit:
+        (key, kind, id) = self.keys[i]
+        if not key.startswith(prefix):
+          break
+        if (kind, id) not in seen:
+          seen.add((kind, id))
+          results.append(dict(type = kind, id = id, name = self.names[(kind, id)]))
+        i += 1
+    return results
+
+  def _remove(self, kind, id):
+    name = self.names.pop((kind, id), None)
+    if name is None:
+      return
+    for key in self._keys(kind, id, name):
+      i = bisect_left(self.keys, key)
+      if i < len(self.keys) and self.keys[i] == key:
+        del self.keys[i]
+
+  @staticmethod
+  def _keys(kind, id, name):
+    words = (name or '').lower().split()
+    return {(' '.join(words[i:]), kind, id) for i in range(len(words))}
+
+names = PrefixIndex()
+
+# Loads every artist and venue name into the index.
+def build_index(index=names):
+  entries = [('artist', id, name) for (id, name) in db.session.query(Artist.id, Artist.name).filter(Artist.deleted_at.is_(None))]
+  entries += [('venue', id, name) for (id, name) in db.session.query(Venue.id, Venue.name).filter(Venue.deleted_at.is_(None))]
+  index.rebuild(entries)
+
+# Rebuilds the index when it is older than `max_age` seconds, so names
+# written by other workers show up.
+def refresh_index(max_age, index=names):
+  if index.age() > max_age:
+    build_index(index)
+
+# Builds the index when the app is created: before the first request, and
+# under gunicorn in the master. A database without the current tables, as
+# when `flask db upgrade` or `flask fyyur create-db` are about to run,
+# leaves it empty.
+#
+# A forked worker, including one that replaces a recycled worker long
+# after startup, holds the master's copy from boot time; it is expired in
+# the child, so the worker rebuilds it on its first suggestion.
+def setup_suggestions(app):
+  with app.app_context():
+    try:
+      build_index()
+    except SQLAlchemyError as e:
+      app.logger.warning('suggestion index not built: %s', e)
+    finally:
+      db.session.remove()
+  os.register_at_fork(after_in_child=names.expire)
@@ -0,0 +1,87 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import click
+from flask.cli import with_appcontext
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Template compilation.
+#----------------------------------------------------------------------------#
+
+# Compiled templates are kept in TEMPLATE_CACHE_DIR, so a new worker loads
+# their bytecode instead of compiling each template on its first hit. Jinja
+# checks every cached entry against a checksum of the template's source, so
+# an edited template is recompiled. With TEMPLATE_WARMUP every template is
+# loaded at startup rather than by the first request that renders it. Call
+# this after the template class is set (see instrumentation.track_requests):
+# loaded templates are built with the class in place at the time.
+def setup_templates(app):
+  directory = app.config.get('TEMPLATE_CACHE_DIR')
+  if directory:
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+  if app.config.get('TEMPLATE_WARMUP'):
+    warm_templates(app)
+
+# Loads (compiles, or reads from the bytecode cache) every HTML template and
+# returns their names.
+def warm_templates(app):
+  names = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+  for name in names:
+    app.jinja_env.get_template(name)
+  return names
+
+#----------------------------------------------------------------------------#
+# Command line.
+#----------------------------------------------------------------------------#
+
+# Run in a fresh interpreter, so nothing is imported or compiled yet.
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import babel, flask, flask_migrate, flask_moment, flask_sqlalchemy, flask_wtf, jinja2, sqlalchemy, wtforms
+imported = time.perf_counter()
+import app
+client = app.create_app().test_client()
+created = time.perf_counter()
+requests = []
+for _ in range(2):
+  start = time.perf_counter()
+  client.get(sys.argv[1])
+  requests.append(time.perf_counter() - start)
+print(json.dumps(dict(
+  import_ms = (imported - started) * 1000, app_ms = (created - imported) * 1000,
+  first_request_ms = requests[0] * 1000, second_request_ms = requests[1] * 1000)))
+'''
+
+COLUMNS = ('import_ms', 'app_ms', 'first_request_ms', 'second_request_ms')
+
+@click.command('startup')
+@with_appcontext
+@click.option('--path', default='/venues', show_default=True, help='Route to request.')
+@click.option('--runs', default=5, show_default=True)
+@click.option('--warmup/--no-warmup', default=False, help='Load all templates at startup.')
+@click.option('--cold', is_flag=True, help='Clear the template bytecode cache before the first run.')
+def startup_command(path, runs, warmup, cold):
+  """Time imports, app creation and the first requests of a new process."""
+  directory = current_app.config.get('TEMPLATE_CACHE_DIR')
+  if cold and directory:
+    shutil.rmtree(directory, ignore_errors=True)
+  env = dict(os.environ, TEMPLATE_WARMUP='1' if warmup else '')
+
+  click.echo('%-6s %12s %12s %18s %19s' % (('run',) + COLUMNS))
+  results = []
+  for run in range(1, runs + 1):
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, path], cwd=current_app.root_path, env=env, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    results.append(result)
+    click.echo('%-6d %12.1f %12.1f %18.1f %19.1f' % ((run,) + tuple(result[c] for c in COLUMNS)))
+  click.echo('%-6s %12.1f %12.1f %18.1f %19.1f' % (('median',) + tuple(statistics.median(r[c] for r in results) for c in COLUMNS)))
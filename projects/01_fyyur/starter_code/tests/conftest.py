@@ -0,0 +1,98 @@
+#----------------------------------------------------------------------------#
+# Route benchmarks.
+#
+#   $ pytest tests
+#   $ FYYUR_BENCH_VENUES=10000 FYYUR_BENCH_ARTISTS=50000 FYYUR_BENCH_SHOWS=1000000 pytest tests
+#   $ pytest tests --update-baseline
+#
+# The database is a copy of a template created from the models and seeded
+# (see schema.py); the template is only rebuilt when the schema, the
+# seed data or the day change. By default the copy is a SQLite file in a
+# temporary directory; set FYYUR_BENCH_DATABASE_URL to use a throwaway
+# Postgres database instead (it is dropped and recreated).
+#----------------------------------------------------------------------------#
+import inspect
+import json
+import os
+import sys
+from datetime import date
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+def pytest_addoption(parser):
+  group = parser.getgroup('fyyur')
+  group.addoption('--update-baseline', action='store_true', help='Write the measured query counts and latencies to benchmark_baseline.json.')
+  group.addoption('--check-latency', action='store_true', help='Also fail routes whose p95 latency exceeds the baseline by more than --latency-tolerance.')
+  group.addoption('--latency-tolerance', type=float, default=1.5, help='Allowed p95 latency as a multiple of the baseline (default 1.5).')
+  group.addoption('--rounds', type=int, default=int(os.environ.get('FYYUR_BENCH_ROUNDS', 20)), help='Measured requests per route (default 20).')
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+  from app import create_app
+  from config import db
+  from schema import clone_database, create_schema, snapshot_key
+  import seed
+
+  url = os.environ.get('FYYUR_BENCH_DATABASE_URL') or 'sqlite:///' + str(tmp_path_factory.mktemp('fyyur') / 'bench.db')
+  volumes = dict(
+    venues=int(os.environ.get('FYYUR_BENCH_VENUES', 200)),
+    artists=int(os.environ.get('FYYUR_BENCH_ARTISTS', 1000)),
+    shows=int(os.environ.get('FYYUR_BENCH_SHOWS', 5000)))
+
+  def build(template_url):
+    builder = create_app(dict(SQLALCHEMY_DATABASE_URI = template_url, TESTING = True))
+    with builder.app_context():
+      create_schema()
+      seed.seed(db, **volumes)
+      db.session.remove()
+      db.get_engine(builder).dispose()
+
+  # shows are seeded around today, so a template lasts a day
+  clone_database(url, snapshot_key(inspect.getsource(seed), sorted(volumes.items()), date.today()), build)
+  app = create_app(dict(
+    SQLALCHEMY_DATABASE_URI = url,
+    WTF_CSRF_ENABLED = False,
+    TESTING = True,
+    PURGE_IN_BACKGROUND = False))
+  yield app
+  with app.app_context():
+    db.session.remove()
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
+
+@pytest.fixture(scope='session')
+def baseline():
+  if not os.path.exists(BASELINE):
+    return {}
+  with open(BASELINE) as f:
+    return json.load(f)
+
+# Measurements of this run, by route, written to the baseline file at the
+# end of the session with --update-baseline and summarised in the report.
+@pytest.fixture(scope='session')
+def results(request):
+  measured = request.config.fyyur_results = {}
+  yield measured
+  if request.config.getoption('--update-baseline') and measured:
+    stored = {}
+    if os.path.exists(BASELINE):
+      with open(BASELINE) as f:
+        stored = json.load(f)
+    stored.update(measured)
+    with open(BASELINE, 'w') as f:
+      json.dump(stored, f, indent=2, sort_keys=True)
+      f.write('\n')
+
+def pytest_terminal_summary(terminalreporter, config):
+  measured = getattr(config, 'fyyur_results', None)
+  if not measured:
+    return
+  terminalreporter.section('fyyur route benchmarks')
+  terminalreporter.line('%-32s %8s %10s %10s' % ('route', 'queries', 'p50 (ms)', 'p95 (ms)'))
+  for (route, m) in sorted(measured.items()):
+    terminalreporter.line('%-32s %8d %10.2f %10.2f' % (route, m['queries'], m['p50_ms'], m['p95_ms']))
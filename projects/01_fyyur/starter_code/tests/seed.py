@@ -0,0 +1,78 @@
+#----------------------------------------------------------------------------#
+# Synthetic data for the route benchmarks.
+#
+# Rows go in with Core executemany in chunks, so a million shows take
+# seconds rather than the minutes the ORM would need. The data is the same
+# for the same volumes on every run.
+#----------------------------------------------------------------------------#
+import random
+from datetime import datetime, timedelta
+from forms import VenueForm
+from models import Artist, Venue, Show, Genre, venue_genres, artist_genres, search_document, SHOW_DURATION
+
+GENRES = [name for (name, _) in VenueForm.genres.kwargs['choices']]
+STATES = ['CA', 'NY', 'TX', 'WA', 'IL', 'MA', 'OR', 'CO', 'FL', 'GA']
+
+def chunked(rows, size):
+  chunk = []
+  for row in rows:
+    chunk.append(row)
+    if len(chunk) == size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+def insert(db, table, rows, chunk_size):
+  for chunk in chunked(rows, chunk_size):
+    db.session.execute(table.insert(), chunk)
+
+# Creates `venues` venues and `artists` artists, each with one to three
+# genres, and `shows` shows spread over the two years around `now`. Venue and
+# artist ids run from 1, so routes can be pointed at known rows; venue 1 and
+# artist 1 have their share of shows like every other row.
+#
+# Shows are booked in rounds: in each round every venue (or every artist,
+# whichever there are fewer of) plays once, and rounds are far enough apart
+# that no venue or artist is double booked.
+def seed(db, venues=200, artists=1000, shows=5000, now=None, chunk_size=10000):
+  now = now or datetime.utcnow()
+  rng = random.Random(0)
+  cities = max(venues // 20, 1)
+
+  insert(db, Genre.__table__, (dict(id = i, name = name) for (i, name) in enumerate(GENRES, 1)), chunk_size)
+
+  def entities(model, n, extra):
+    for i in range(1, n + 1):
+      genres = rng.sample(range(1, len(GENRES) + 1), rng.randint(1, 3))
+      city = 'City %d' % (i % cities)
+      state = STATES[i % len(STATES)]
+      name = '%s %d' % (model.__name__, i)
+      row = dict(
+        id = i, name = name, city = city, state = state, phone = '555-555-%04d' % (i % 10000),
+        image_link = 'https://example.com/%s/%d.jpg' % (model.__tablename__.lower(), i),
+        search_text = search_document(name, city, state, [GENRES[g - 1] for g in genres]))
+      row.update(extra)
+      yield row, genres
+
+  for (model, association, fk, n, extra) in (
+      (Venue, venue_genres, 'venue_id', venues, dict(address = '1 Main St', seeking_talent = False)),
+      (Artist, artist_genres, 'artist_id', artists, dict(seeking_venue = False))):
+    links = []
+    def rows():
+      for (row, genres) in entities(model, n, extra):
+        links.extend({fk: row['id'], 'genre_id': g} for g in genres)
+        yield row
+    insert(db, model.__table__, rows(), chunk_size)
+    insert(db, association, links, chunk_size)
+
+  per_round = min(venues, artists)
+  rounds = -(-shows // per_round)
+  step = max(timedelta(hours=3), timedelta(days=730) / rounds)
+  first = now - step * (rounds // 2)
+  def bookings():
+    for i in range(shows):
+      start_time = first + step * (i // per_round) + timedelta(minutes=rng.randint(0, 59))
+      yield dict(venue_id = i % venues + 1, artist_id = i % artists + 1, start_time = start_time, end_time = start_time + SHOW_DURATION)
+  insert(db, Show.__table__, bookings(), chunk_size)
+  db.session.commit()
@@ -0,0 +1,101 @@
+#----------------------------------------------------------------------------#
+# The static asset build and the /assets route, on a copy of static/.
+#----------------------------------------------------------------------------#
+import gzip
+import itertools
+import os
+import shutil
+import pytest
+from flask import Flask, render_template_string
+from assets import Assets, BUNDLES, build, minify_css, minify_js, brotli, rjsmin
+from cache import pages
+
+@pytest.fixture(scope='module')
+def built(app, tmp_path_factory):
+  static_folder = str(tmp_path_factory.mktemp('assets') / 'static')
+  shutil.copytree(app.static_folder, static_folder, ignore=shutil.ignore_patterns('dist'))
+  manifest = build(static_folder)
+  site = Flask(__name__, static_folder=static_folder)
+  Assets(site)
+  return site, manifest
+
+def test_minify_css():
+  css = '/* header */\na > b ,\nc:hover {\n  color : red;\n  margin: 0 auto;\n}\n@media (max-width: 767px) { .x { width: calc(100% - 10px); } }'
+  assert minify_css(css) == 'a>b,c:hover{color :red;margin:0 auto}@media (max-width:767px){.x{width:calc(100% - 10px)}}'
+
+def test_minify_js():
+  js = '/*! license */\n// a comment\nvar a = 1 ;\n\nfunction f ( x ) {\n  return x + a;\n}\n//# sourceMappingURL=f.js.map\n'
+  if rjsmin is None:
+    assert minify_js(js) == js.replace('//# sourceMappingURL=f.js.map', '').strip()
+  else:
+    assert minify_js(js) == '/*! license */var a=1;function f(x){return x+a;}'
+
+def test_build_fingerprints_and_compresses(built):
+  (site, manifest) = built
+  name = manifest['assets']['site.css']
+  assert name.startswith('css/site.') and name != 'css/site.css'
+  path = os.path.join(site.static_folder, 'dist', name)
+  with open(path, 'rb') as f, open(path + '.gz', 'rb') as g:
+    assert gzip.decompress(g.read()) == f.read()
+  assert manifest['encodings'][name] == (['br', 'gzip'] if brotli else ['gzip'])
+  # images are left uncompressed
+  assert manifest['encodings'][manifest['assets']['img/front-splash.jpg']] == []
+
+def test_serves_precompressed_immutable_assets(built):
+  (site, manifest) = built
+  client = site.test_client()
+  url = '/assets/' + manifest['assets']['site.js']
+
+  response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+  assert response.status_code == 200
+  assert response.content_encoding == 'gzip'
+  assert response.mimetype in ('application/javascript', 'text/javascript')
+  assert 'immutable' in response.headers['Cache-Control'] and 'max-age=31536000' in response.headers['Cache-Control']
+  assert 'Accept-Encoding' in response.headers['Vary']
+  plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+  assert plain.content_encoding is None and gzip.decompress(response.data) == plain.data
+  assert client.get('/assets/css/site.css').status_code == 404
+
+  with site.test_request_context():
+    assert render_template_string("{{ asset_urls('site.css')|join(' ') }}") == '/assets/' + manifest['assets']['site.css']
+
+def test_falls_back_to_the_sources_without_a_build(app):
+  with app.test_request_context():
+    assert render_template_string("{{ asset_urls('head.js')|join(' ') }}") == '/static/js/libs/modernizr-2.8.2.min.js /static/js/libs/moment.min.js'
+
+def test_rebuilds_keep_the_previous_build(app, tmp_path):
+  # just the bundles' sources
+  static_folder = str(tmp_path / 'static')
+  for source in itertools.chain(*BUNDLES.values()):
+    os.makedirs(os.path.dirname(os.path.join(static_folder, source)), exist_ok=True)
+    shutil.copyfile(os.path.join(app.static_folder, source), os.path.join(static_folder, source))
+  dist = os.path.join(static_folder, 'dist')
+  names = []
+  for n in range(3):
+    with open(os.path.join(static_folder, 'css', 'main.css'), 'a') as f:
+      f.write('\n.build-%d { color: red; }\n' % n)
+    manifest = build(static_folder, keep=2)
+    names.append(manifest['assets']['site.css'])
+  assert len(set(names)) == 3
+
+  # the build before is kept and still served, the one before that is gone
+  assert os.path.exists(os.path.join(dist, names[1])) and os.path.exists(os.path.join(dist, names[1] + '.gz'))
+  assert not os.path.exists(os.path.join(dist, names[0])) and not os.path.exists(os.path.join(dist, names[0] + '.gz'))
+  site = Flask(__name__, static_folder=static_folder)
+  Assets(site)
+  client = site.test_client()
+  assert client.get('/assets/' + names[1]).status_code == 200
+  assert client.get('/assets/' + names[0]).status_code == 404
+
+  # unchanged sources rebuild to the same files and keep the previous build
+  assert build(static_folder, keep=2)['previous'] == manifest['previous']
+  assert os.path.exists(os.path.join(dist, names[1]))
+
+def test_a_new_build_misses_the_page_cache(app, client, monkeypatch):
+  client.get('/artists')
+  misses = pages.misses
+  client.get('/artists')
+  assert pages.misses == misses
+  monkeypatch.setitem(app.extensions['assets'], 'hash', 'rebuilt')
+  client.get('/artists')
+  assert pages.misses == misses + 1
@@ -0,0 +1,88 @@
+#----------------------------------------------------------------------------#
+# Double booking checks. Shows are booked far in the future, clear of the
+# seeded ones.
+#----------------------------------------------------------------------------#
+import json
+import re
+from datetime import datetime, timedelta
+from wtforms.validators import NumberRange
+from booking import BookingChecker, conflicts, overlaps
+from config import db
+from forms import ShowForm
+from importer import run_import
+from models import Artist, Show
+
+HOUR = timedelta(hours=1)
+NOON = datetime(2150, 6, 1, 12)
+
+def test_overlaps():
+  spans = [(NOON, NOON + 2 * HOUR), (NOON + 3 * HOUR, NOON + 4 * HOUR)]
+  assert overlaps(spans, NOON + HOUR, NOON + 3 * HOUR)
+  assert overlaps(spans, NOON - HOUR, NOON + HOUR)
+  assert not overlaps(spans, NOON + 2 * HOUR, NOON + 3 * HOUR)
+  assert not overlaps(spans, NOON + 4 * HOUR, NOON + 5 * HOUR)
+
+def test_create_show_rejects_double_booking(app, client):
+  booked = dict(venue_id = '103', artist_id = '3', start_time = '2150-06-01 12:00:00', duration = '120')
+  client.post('/shows/create', data=booked)
+  for (venue_id, artist_id) in (('103', '4'), ('104', '3')):
+    client.post('/shows/create', data=dict(booked, venue_id = venue_id, artist_id = artist_id, start_time = '2150-06-01 13:00:00'))
+  client.post('/shows/create', data=dict(booked, start_time = '2150-06-01 14:00:00'))
+
+  with app.app_context():
+    shows = db.session.query(Show.start_time).filter(Show.start_time >= NOON, Show.venue_id.in_([103, 104])).order_by(Show.start_time).all()
+    assert [start_time for (start_time,) in shows] == [NOON, NOON + 2 * HOUR]
+    assert [row.side for row in conflicts(103, 5, NOON + HOUR, NOON + 3 * HOUR)] == ['venue', 'venue']
+
+def test_create_show_accepts_the_rendered_default_duration(app, client):
+  # a float default renders as "120.0", which IntegerField can't read back
+  kwargs = ShowForm.duration.kwargs
+  assert type(kwargs['default']) is int
+  assert all(type(v.max) is int for v in kwargs['validators'] if isinstance(v, NumberRange))
+
+  page = client.get('/shows/create').get_data(as_text=True)
+  duration = re.search(r'<input[^>]*name="duration"[^>]*value="([^"]*)"', page).group(1)
+  assert duration == '120'
+  client.post('/shows/create', data=dict(venue_id = '108', artist_id = '8', start_time = '2151-06-01 12:00:00', duration = duration))
+
+  with app.app_context():
+    (end_time,) = db.session.query(Show.end_time).filter(Show.venue_id == 108, Show.start_time == datetime(2151, 6, 1, 12)).one()
+    assert end_time == datetime(2151, 6, 1, 14)
+
+def test_create_show_refuses_deleted_artists_and_missing_venues(app, client):
+  with app.app_context():
+    db.session.query(Artist).filter(Artist.id == 12).update(dict(deleted_at = datetime.utcnow()))
+    db.session.commit()
+  try:
+    show = dict(venue_id = '110', artist_id = '12', start_time = '2154-06-01 12:00:00', duration = '60')
+    page = client.post('/shows/create', data=show).get_data(as_text=True)
+    assert 'The artist does not exist or was deleted.' in page
+    page = client.post('/shows/create', data=dict(show, venue_id = '1000000', artist_id = '11')).get_data(as_text=True)
+    assert 'The venue does not exist or was deleted.' in page
+    with app.app_context():
+      assert not db.session.query(Show.id).filter(Show.start_time == datetime(2154, 6, 1, 12)).all()
+  finally:
+    with app.app_context():
+      db.session.query(Artist).filter(Artist.id == 12).update(dict(deleted_at = None))
+      db.session.commit()
+
+def test_checker_rejects_overlaps_within_a_batch(app):
+  later = NOON + 24 * HOUR
+  batch = [
+    (1, {}, dict(venue_id = 105, artist_id = 5, start_time = later, end_time = later + 2 * HOUR)),
+    (2, {}, dict(venue_id = 105, artist_id = 6, start_time = later + HOUR, end_time = later + 2 * HOUR)),
+    (3, {}, dict(venue_id = 106, artist_id = 5, start_time = later + 2 * HOUR, end_time = later + 3 * HOUR)),
+  ]
+  with app.app_context():
+    (accepted, rejected) = BookingChecker().check(batch)
+  assert [line for (line, _, _) in accepted] == [1, 3]
+  assert [(line, list(errors)) for (line, _, errors) in rejected] == [(2, ['venue'])]
+
+def test_import_dry_run_writes_nothing(app, tmp_path):
+  records = [dict(venue_id = 107, artist_id = 7, start_time = '2150-06-03 12:00:00'), dict(venue_id = 107, artist_id = 8, start_time = '2150-06-03 13:00:00')]
+  path = tmp_path / 'shows.json'
+  path.write_text(json.dumps(records))
+  with app.app_context():
+    before = db.session.query(Show).count()
+    assert run_import('shows', str(path), batch_size=1, dry_run=True, echo=lambda line: None) == (1, 1)
+    assert db.session.query(Show).count() == before
@@ -0,0 +1,39 @@
+#----------------------------------------------------------------------------#
+# Conditional GET of the venue and artist pages.
+#----------------------------------------------------------------------------#
+from sqlalchemy import update
+from config import db
+from models import Venue
+
+def test_a_matching_etag_gets_a_304(client):
+  response = client.get('/venues/2')
+  etag = response.headers['ETag']
+  assert response.status_code == 200 and 'Last-Modified' not in response.headers
+  response = client.get('/venues/2', headers={'If-None-Match': etag})
+  assert response.status_code == 304 and response.headers['ETag'] == etag
+
+  # an If-Modified-Since date alone can't tell whether a show has started
+  response = client.get('/venues/2', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+  assert response.status_code == 200
+
+def test_a_new_release_changes_the_etag(app, client, monkeypatch):
+  etag = client.get('/artists/2').headers['ETag']
+  monkeypatch.setitem(app.extensions['assets'], 'hash', 'rebuilt')
+  response = client.get('/artists/2', headers={'If-None-Match': etag})
+  assert response.status_code == 200 and response.headers['ETag'] != etag
+
+  monkeypatch.undo()
+  assert client.get('/artists/2', headers={'If-None-Match': etag}).status_code == 304
+  monkeypatch.setitem(app.config, 'APP_VERSION', 'next')
+  assert client.get('/artists/2', headers={'If-None-Match': etag}).status_code == 200
+
+def test_a_changed_page_is_not_served_from_the_cache(app, client):
+  etag = client.get('/venues/3').headers['ETag']
+  # changed by another process: nothing here invalidated the cached page
+  with app.app_context():
+    db.session.execute(update(Venue).where(Venue.id == 3).values(phone = '555-444-0003', version = Venue.version + 1))
+    db.session.commit()
+  response = client.get('/venues/3', headers={'If-None-Match': etag})
+  assert response.status_code == 200 and response.headers['ETag'] != etag
+  assert '555-444-0003' in response.get_data(as_text=True)
+  assert client.get('/venues/3', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
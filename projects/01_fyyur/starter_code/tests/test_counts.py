@@ -0,0 +1,48 @@
+#----------------------------------------------------------------------------#
+# Upcoming and past show counts.
+#----------------------------------------------------------------------------#
+import re
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, postgresql
+from config import db
+from models import Artist, Show
+from queries import count_where, show_counts, venue_listing, artist_listing, NO_SHOWS
+
+def test_count_where_falls_back_to_case():
+  statement = select(count_where(Show.start_time > datetime(2000, 1, 1)))
+  assert 'COUNT(*) FILTER (WHERE' in str(statement.compile(dialect=postgresql.dialect()))
+  assert 'COUNT(CASE WHEN' in str(statement.compile(dialect=mysql.dialect()))
+
+def test_show_counts_match_the_shows(app):
+  now = datetime.utcnow()
+  with app.app_context():
+    ids = [1, 2, 3]
+    counts = show_counts('venue', ids + [10 ** 6], now)
+    for venue_id in ids:
+      shows = db.session.query(Show.start_time).join(Artist, Artist.id == Show.artist_id) \
+        .filter(Show.venue_id == venue_id, Artist.deleted_at.is_(None)).all()
+      upcoming = sum(1 for (start_time,) in shows if start_time > now)
+      assert counts.get(venue_id, NO_SHOWS) == (upcoming, len(shows) - upcoming)
+    assert 10 ** 6 not in counts
+
+    listed = {venue.id: (venue.num_upcoming_shows, venue.num_past_shows) for venue in venue_listing(now)}
+    assert all(listed[venue_id] == counts.get(venue_id, NO_SHOWS) for venue_id in ids)
+
+def upcoming_on(page, kind, id):
+  match = re.search(r'href="/%ss/%d">.*?(\d+) upcoming' % (kind, id), page, re.S)
+  return int(match.group(1))
+
+def test_listings_show_upcoming_counts_and_follow_new_shows(app, client):
+  with app.app_context():
+    (listed,) = [artist.num_upcoming_shows for artist in artist_listing(datetime.utcnow()) if artist.id == 9]
+    db.session.remove()
+  # cached after the first request
+  client.get('/artists')
+  assert upcoming_on(client.get('/artists').get_data(as_text=True), 'artist', 9) == listed
+  venues = client.get('/venues').get_data(as_text=True)
+
+  response = client.post('/shows/create', data=dict(venue_id = '109', artist_id = '9', start_time = '2153-01-01 20:00:00', duration = '60'))
+  assert 'Show successfully listed!' in response.get_data(as_text=True)
+  assert upcoming_on(client.get('/artists').get_data(as_text=True), 'artist', 9) == listed + 1
+  assert upcoming_on(client.get('/venues').get_data(as_text=True), 'venue', 109) == upcoming_on(venues, 'venue', 109) + 1
@@ -0,0 +1,91 @@
+#----------------------------------------------------------------------------#
+# Edit forms: partial updates and concurrent edits. Venue and artist 7 are
+# left to these tests.
+#----------------------------------------------------------------------------#
+import pytest
+from sqlalchemy import update
+from config import db
+from editing import load_for_edit, save_changes, EditConflict
+from instrumentation import count_queries
+from models import Artist, Venue
+
+def form_for(app, model, id):
+  with app.app_context():
+    entity = db.session.get(model, id)
+    form = dict(
+      name = entity.name, city = entity.city, state = entity.state, phone = entity.phone,
+      website = entity.website or '', facebook_link = entity.facebook_link or '',
+      image_link = entity.image_link or '', seeking_description = entity.seeking_description or '',
+      genres = entity.genres, version = str(entity.version))
+    if model is Venue:
+      form.update(address = entity.address)
+      if entity.seeking_talent:
+        form.update(seeking_talent = 'y')
+    elif entity.seeking_venue:
+      form.update(seeking_venue = 'y')
+    db.session.remove()
+  return form
+
+def current(app, model, id):
+  with app.app_context():
+    entity = db.session.get(model, id)
+    values = dict(name = entity.name, phone = entity.phone, version = entity.version, genres = entity.genres)
+    db.session.remove()
+  return values
+
+def test_edit_form_is_prefilled_from_one_query(app, client):
+  before = current(app, Venue, 7)
+  with count_queries() as statements:
+    response = client.get('/venues/7/edit')
+  assert response.status_code == 200 and statements.count == 1
+  page = response.get_data(as_text=True)
+  assert 'value="%s"' % before['name'] in page
+  assert 'name="version" value="%d"' % before['version'] in page
+
+def test_edit_writes_only_the_changed_columns(app, client):
+  form = form_for(app, Venue, 7)
+  before = current(app, Venue, 7)
+  with count_queries() as statements:
+    response = client.post('/venues/7/edit', data=dict(form, phone = '555-000-0007'))
+  assert response.status_code == 302 and response.location.endswith('/venues/7')
+  (update,) = [s for s in statements.statements if s.startswith('UPDATE')]
+  assert 'phone=' in update and 'version=' in update
+  assert 'name=' not in update and 'city=' not in update and 'address=' not in update
+  assert 'WHERE "Venue".id = ? AND "Venue".version = ?' in update
+  assert current(app, Venue, 7) == dict(before, phone = '555-000-0007', version = before['version'] + 1)
+
+  # nothing changed, nothing written
+  with count_queries() as statements:
+    client.post('/venues/7/edit', data=dict(form, phone = '555-000-0007', version = str(before['version'] + 1)))
+  assert not [s for s in statements.statements if s.startswith('UPDATE')]
+
+def test_genre_changes_bump_the_version(app, client):
+  form = form_for(app, Artist, 7)
+  before = current(app, Artist, 7)
+  genres = ['Folk'] if before['genres'] != ['Folk'] else ['Jazz']
+  client.post('/artists/7/edit', data=dict(form, genres = genres))
+  after = current(app, Artist, 7)
+  assert after['genres'] == genres and after['version'] == before['version'] + 1
+
+def test_stale_edits_are_refused(app, client):
+  form = form_for(app, Artist, 7)
+  client.post('/artists/7/edit', data=dict(form, phone = '555-111-0007'))
+  before = current(app, Artist, 7)
+
+  # a second edit from the same, now outdated, form
+  response = client.post('/artists/7/edit', data=dict(form, name = 'Overwritten'))
+  assert response.status_code == 302 and response.location.endswith('/artists/7/edit')
+  assert current(app, Artist, 7) == before
+  page = client.get('/artists/7/edit').get_data(as_text=True)
+  assert 'changed by someone else' in page and 'value="555-111-0007"' in page
+
+def test_a_concurrent_update_is_a_conflict(app):
+  with app.app_context():
+    artist = load_for_edit(Artist, 7)
+    # another request saves the artist between this one's read and write
+    with db.engine.begin() as connection:
+      connection.execute(update(Artist).where(Artist.id == 7).values(phone = '555-222-0007', version = Artist.version + 1))
+    with pytest.raises(EditConflict):
+      save_changes(artist, artist.version, dict(phone = '555-333-0007'))
+    db.session.remove()
+  assert current(app, Artist, 7)['phone'] == '555-222-0007'
@@ -0,0 +1,120 @@
+#----------------------------------------------------------------------------#
+# create_app, and what serving it from several processes relies on.
+#----------------------------------------------------------------------------#
+import os
+import runpy
+from logging.handlers import RotatingFileHandler, WatchedFileHandler
+import pytest
+from sqlalchemy import func
+from app import create_app
+from cache import LRUCache, NullCache, create_backend
+from config import db
+from logs import file_handler
+from models import Venue
+from suggest import names
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+@pytest.fixture
+def another(app):
+  return create_app(dict(
+    SQLALCHEMY_DATABASE_URI = app.config['SQLALCHEMY_DATABASE_URI'],
+    TESTING = True,
+    PURGE_IN_BACKGROUND = False))
+
+def test_apps_share_the_session_secret(app, another):
+  assert app.secret_key and app.secret_key == another.secret_key
+  cookie = app.session_interface.get_signing_serializer(app).dumps({'_flashes': [('message', 'saved')]})
+  assert another.session_interface.get_signing_serializer(another).loads(cookie) == {'_flashes': [('message', 'saved')]}
+
+def test_overrides_apply_to_one_app(app, another):
+  assert app.config['WTF_CSRF_ENABLED'] is False
+  assert another.config.get('WTF_CSRF_ENABLED', True) is True
+  assert another.test_client().get('/venues').status_code == 200
+
+def test_suggestions_are_loaded_when_the_app_is_created(app, another, tmp_path):
+  with app.app_context():
+    live = db.session.query(func.count(Venue.id)).filter(Venue.deleted_at.is_(None)).scalar()
+    db.session.remove()
+  assert len([key for key in names.names if key[0] == 'venue']) == live
+
+  # a database without tables yet doesn't stop the app from being created
+  names.rebuild([])
+  empty = create_app(dict(SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'empty.db'), TESTING = True))
+  assert len(names) == 0
+  with empty.app_context():
+    db.get_engine(empty).dispose()
+  create_app(dict(SQLALCHEMY_DATABASE_URI = app.config['SQLALCHEMY_DATABASE_URI'], TESTING = True))
+  assert len(names) > 0
+
+def test_suggestions_pick_up_names_written_elsewhere(app, client, monkeypatch):
+  # written by another worker: this process's index doesn't know it
+  with app.app_context():
+    venue = Venue(name = 'Elsewhere Hall', city = 'San Francisco', state = 'CA')
+    db.session.add(venue)
+    db.session.commit()
+    db.session.remove()
+  client.get('/search/suggest?q=venue')
+  assert client.get('/search/suggest?q=elsewhere').get_json()['suggestions'] == []
+  monkeypatch.setitem(app.config, 'SUGGEST_MAX_AGE', 0)
+  assert [s['name'] for s in client.get('/search/suggest?q=elsewhere').get_json()['suggestions']] == ['Elsewhere Hall']
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_rebuilds_the_suggestions(app):
+  names.rebuild([])
+  pid = os.fork()
+  if pid == 0:
+    os._exit(0 if names.age() == float('inf') else 1)
+  (_, status) = os.waitpid(pid, 0)
+  assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+  assert names.age() < 60
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_opens_its_own_connections(app):
+  with app.app_context():
+    expected = db.session.query(func.count(Venue.id)).scalar()
+    db.session.remove()
+  # the pool whose connections the child inherits
+  pool = db.get_engine(app).pool
+
+  pid = os.fork()
+  if pid == 0:
+    status = 1
+    try:
+      with app.app_context():
+        if db.get_engine(app).pool is not pool and db.session.query(func.count(Venue.id)).scalar() == expected:
+          status = 0
+        db.session.remove()
+    finally:
+      os._exit(status)
+  (_, status) = os.waitpid(pid, 0)
+  assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+  # and the parent's connections still work once the child is gone
+  with app.app_context():
+    assert db.session.query(func.count(Venue.id)).scalar() == expected
+    db.session.remove()
+
+def test_gunicorn_config(monkeypatch):
+  # the config sets defaults in os.environ; keep them to this test
+  monkeypatch.setattr(os, 'environ', os.environ.copy())
+  monkeypatch.setenv('WEB_CONCURRENCY', '3')
+  monkeypatch.setenv('PORT', '8123')
+  monkeypatch.delenv('FLASK_DEBUG', raising=False)
+  monkeypatch.delenv('TEMPLATE_WARMUP', raising=False)
+  settings = runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+  assert settings['workers'] == 3 and settings['bind'] == '0.0.0.0:8123'
+  assert settings['preload_app'] is True
+  assert settings['wsgi_app'] == 'app:create_app()'
+  assert os.environ['FLASK_DEBUG'] == '0' and os.environ['TEMPLATE_WARMUP'] == '1'
+  assert os.environ['SERVER_PROCESSES'] == '3'
+
+def test_several_processes_leave_log_rotation_alone(app, tmp_path):
+  config = dict(app.config, LOG_FILE = str(tmp_path / 'fyyur.log'), LOG_ROTATE_WHEN = None)
+  assert type(file_handler(dict(config, SERVER_PROCESSES = 3))) is WatchedFileHandler
+  assert type(file_handler(dict(config, SERVER_PROCESSES = 1))) is RotatingFileHandler
+
+def test_several_processes_need_a_shared_page_cache(app):
+  config = dict(app.config, SERVER_PROCESSES = 3, PAGE_CACHE_REDIS_URL = None)
+  assert isinstance(create_backend(config), NullCache)
+  assert isinstance(create_backend(dict(config, SERVER_PROCESSES = 1)), LRUCache)
@@ -0,0 +1,100 @@
+#----------------------------------------------------------------------------#
+# Bulk imports. Records use their own names and far-future dates, so the
+# rows they add don't disturb the seeded ones.
+#----------------------------------------------------------------------------#
+import io
+import json
+from datetime import datetime
+import pytest
+from config import db
+from importer import KeyResolver, iter_csv, run_import
+from models import Artist, ImportCheckpoint, Show, Venue
+
+def quiet(line):
+  pass
+
+def write_csv(path, header, rows):
+  path.write_text('\n'.join([header] + rows) + '\n', encoding='utf-8')
+  return str(path)
+
+def test_iter_csv_splits_genres():
+  f = io.StringIO('name,genres\nCSV Venue,"Jazz, Blues,"\nNo Genres,\n')
+  assert list(iter_csv(f)) == [dict(name = 'CSV Venue', genres = ['Jazz', 'Blues']), dict(name = 'No Genres', genres = '')]
+
+def test_import_venues_from_csv(app, tmp_path):
+  path = write_csv(tmp_path / 'venues.csv', 'name,city,state,address,genres,seeking_talent', [
+    'Imported Venue 1,San Francisco,CA,1 Import St,"Jazz, Blues",y',
+    'Imported Venue 2,New York,NY,2 Import St,Folk,',
+    'Imported Venue 3,Nowhere,XX,3 Import St,Jazz,',
+  ])
+  rejects = io.StringIO()
+  with app.app_context():
+    assert run_import('venues', path, batch_size=2, rejects=rejects, echo=quiet) == (2, 1)
+    venues = Venue.query.filter(Venue.name.like('Imported Venue %')).order_by(Venue.name).all()
+    assert [(v.name, v.city, v.state, v.genres, v.seeking_talent) for v in venues] == [
+      ('Imported Venue 1', 'San Francisco', 'CA', ['Blues', 'Jazz'], True),
+      ('Imported Venue 2', 'New York', 'NY', ['Folk'], False),
+    ]
+    db.session.remove()
+  (rejected,) = [json.loads(line) for line in rejects.getvalue().splitlines()]
+  assert rejected['line'] == 3
+  assert rejected['record']['name'] == 'Imported Venue 3'
+  assert list(rejected['errors']) == ['state']
+
+def test_import_artists_from_json(app, tmp_path):
+  records = [
+    dict(name = 'Imported Artist 1', city = 'Austin', state = 'TX', genres = ['Country', 'Folk'], seeking_venue = True),
+    dict(name = 'Imported Artist 2', city = 'Austin', state = 'TX', genres = []),
+  ]
+  path = tmp_path / 'artists.json'
+  path.write_text('\n'.join(json.dumps(r) for r in records))
+  rejects = io.StringIO()
+  with app.app_context():
+    assert run_import('artists', str(path), rejects=rejects, echo=quiet) == (1, 1)
+    (artist,) = Artist.query.filter(Artist.name.like('Imported Artist %')).all()
+    assert (artist.name, artist.genres, artist.seeking_venue) == ('Imported Artist 1', ['Country', 'Folk'], True)
+    db.session.remove()
+  assert [(r['line'], list(r['errors'])) for r in map(json.loads, rejects.getvalue().splitlines())] == [(2, ['genres'])]
+
+def test_key_resolver_takes_ids_and_names(app):
+  batch = [
+    (1, dict(artist_id = '2', venue_id = '2'), {}),
+    (2, dict(artist_name = 'Resolver Artist', venue_name = 'Resolver Venue'), {}),
+    (3, dict(artist_id = '1000000', venue_name = 'Resolver Venue'), {}),
+    (4, dict(artist_name = 'Nobody', venue_id = 'two'), {}),
+  ]
+  with app.app_context():
+    artist = Artist(name = 'Resolver Artist', city = 'Austin', state = 'TX')
+    venue = Venue(name = 'Resolver Venue', city = 'Austin', state = 'TX')
+    db.session.add_all([artist, venue])
+    db.session.commit()
+    (resolved, rejected) = KeyResolver().resolve(batch)
+    assert [(line, row) for (line, _, row) in resolved] == [
+      (1, dict(artist_id = 2, venue_id = 2)),
+      (2, dict(artist_id = artist.id, venue_id = venue.id)),
+    ]
+    assert [(line, sorted(errors)) for (line, _, errors) in rejected] == [(3, ['artist']), (4, ['artist', 'venue'])]
+    db.session.remove()
+
+def test_import_shows_resumes_after_an_interruption(app, tmp_path):
+  records = [dict(venue_id = 109, artist_id = 9, start_time = '2160-06-0%d 20:00:00' % day, duration = 60) for day in (1, 2, 3, 4)]
+  records[2]['venue_id'] = 1000000
+  path = tmp_path / 'shows.json'
+  path.write_text(json.dumps(records))
+
+  # stops the import once its first batch has been committed
+  def interrupt(line):
+    raise KeyboardInterrupt
+  with app.app_context():
+    with pytest.raises(KeyboardInterrupt):
+      run_import('shows', str(path), batch_size=2, echo=interrupt)
+    assert db.session.query(ImportCheckpoint).get('shows:%s' % path).position == 2
+    db.session.remove()
+
+  rejects = io.StringIO()
+  with app.app_context():
+    assert run_import('shows', str(path), batch_size=2, rejects=rejects, echo=quiet) == (1, 1)
+    shows = db.session.query(Show.start_time, Show.end_time).filter(Show.venue_id == 109, Show.start_time >= datetime(2160, 1, 1)).order_by(Show.start_time).all()
+    assert shows == [(datetime(2160, 6, day, 20), datetime(2160, 6, day, 21)) for day in (1, 2, 4)]
+    db.session.remove()
+  assert [(r['line'], list(r['errors'])) for r in map(json.loads, rejects.getvalue().splitlines())] == [(3, ['venue'])]
@@ -0,0 +1,18 @@
+#----------------------------------------------------------------------------#
+# Per-request statement timing.
+#----------------------------------------------------------------------------#
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+import instrumentation
+
+def test_failed_statements_are_not_left_running():
+  engine = create_engine('sqlite://')
+  with engine.connect() as connection:
+    connection.execute(text('SELECT 1'))
+    with pytest.raises(OperationalError):
+      connection.execute(text('SELECT * FROM missing'))
+    assert connection.info['query_started'] == []
+    connection.execute(text('SELECT 1'))
+    assert connection.info['query_started'] == []
+  engine.dispose()
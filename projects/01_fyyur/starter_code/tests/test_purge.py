@@ -0,0 +1,26 @@
+#----------------------------------------------------------------------------#
+# Soft delete and the purge of deleted venues.
+#----------------------------------------------------------------------------#
+from datetime import datetime
+from config import db
+from models import Venue, Show, venue_genres
+from purge import purge_deleted
+from queries import venue_listing
+
+def test_deleted_venue_is_hidden_then_purged(app, client):
+  with app.app_context():
+    venue_id = db.session.query(Show.venue_id).join(Venue).filter(Venue.deleted_at.is_(None)).order_by(Show.venue_id.desc()).limit(1).scalar()
+
+  response = client.delete('/venues/%d' % venue_id)
+  assert response.status_code == 303
+  assert client.get('/venues/%d' % venue_id).status_code == 404
+  assert client.delete('/venues/%d' % venue_id).status_code == 404
+  with app.app_context():
+    assert venue_id not in {venue.id for venue in venue_listing(datetime.utcnow())}
+    assert db.session.query(Show).filter_by(venue_id=venue_id).count() > 0
+
+    (shows, rows) = purge_deleted(batch_size=3)
+    assert shows > 3 and rows >= 1
+    assert db.session.query(Venue).get(venue_id) is None
+    assert db.session.query(Show).filter_by(venue_id=venue_id).count() == 0
+    assert db.session.query(venue_genres).filter_by(venue_id=venue_id).count() == 0
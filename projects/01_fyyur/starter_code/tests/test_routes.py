@@ -0,0 +1,119 @@
+#----------------------------------------------------------------------------#
+# Query-count and latency benchmarks for every route in app.py.
+#
+# Each route is requested once to warm up, then --rounds times with the page
+# cache cleared, so the view always does its full work. The number of SQL
+# statements must not exceed the baseline: it doesn't grow with the data,
+# so an N+1 query fails here even at the default volumes.
+#----------------------------------------------------------------------------#
+import itertools
+import time
+import pytest
+from cache import pages
+from config import db
+from instrumentation import count_queries
+from models import Venue
+
+VENUE = dict(
+  name = 'Benchmark Venue', city = 'San Francisco', state = 'CA', address = '1 Main St',
+  phone = '555-555-5555', genres = ['Jazz', 'Blues'], image_link = '', facebook_link = '',
+  website = '', seeking_talent = 'y', seeking_description = 'Looking for jazz acts')
+
+ARTIST = dict(
+  name = 'Benchmark Artist', city = 'San Francisco', state = 'CA',
+  phone = '555-555-5555', genres = ['Jazz'], image_link = '', facebook_link = '',
+  website = '', seeking_venue = 'y', seeking_description = 'Looking for venues')
+
+# a different year every round, so each one books a free slot
+SHOW = dict(artist_id = '1', venue_id = '1', start_time = '2{n:03d}-01-01 20:00:00')
+
+# Venues for delete_venue to delete, so the benchmark doesn't delete rows
+# that other tests read.
+def scratch_venues(app, count):
+  with app.app_context():
+    venues = [Venue(name = 'Scratch Venue %d' % i, city = 'San Francisco', state = 'CA') for i in range(count)]
+    db.session.add_all(venues)
+    db.session.commit()
+    ids = [venue.id for venue in venues]
+    db.session.remove()
+  return ids
+
+# (route, method, url, form data, expected status). {n} in the url or the
+# form data is replaced by 2, 3, ... for routes that can't be repeated with
+# the same values, or by the ids SCRATCH makes for the route.
+ROUTES = [
+  ('index', 'GET', '/', None, 200),
+  ('suggest', 'GET', '/search/suggest?q=venue 1', None, 200),
+  ('cache_stats', 'GET', '/cache/stats', None, 200),
+  ('metrics', 'GET', '/metrics', None, 200),
+  ('venues', 'GET', '/venues', None, 200),
+  ('search_venues', 'POST', '/venues/search', dict(search_term = 'venue 1'), 200),
+  ('show_venue', 'GET', '/venues/1', None, 200),
+  ('create_venue_form', 'GET', '/venues/create', None, 200),
+  ('create_venue_submission', 'POST', '/venues/create', VENUE, 200),
+  ('delete_venue', 'DELETE', '/venues/{n}', None, 303),
+  ('artists', 'GET', '/artists', None, 200),
+  ('search_artists', 'POST', '/artists/search', dict(search_term = 'artist 1'), 200),
+  ('show_artist', 'GET', '/artists/1', None, 200),
+  ('edit_artist', 'GET', '/artists/1/edit', None, 200),
+  ('edit_artist_submission', 'POST', '/artists/1/edit', ARTIST, 302),
+  ('edit_venue', 'GET', '/venues/1/edit', None, 200),
+  ('edit_venue_submission', 'POST', '/venues/1/edit', VENUE, 302),
+  ('create_artist_form', 'GET', '/artists/create', None, 200),
+  ('create_artist_submission', 'POST', '/artists/create', ARTIST, 200),
+  ('show_genre', 'GET', '/genres/Jazz', None, 200),
+  ('shows', 'GET', '/shows', None, 200),
+  ('shows_all', 'GET', '/shows?when=all', None, 200),
+  ('shows_calendar', 'GET', '/shows/calendar', None, 200),
+  ('shows_calendar_city', 'GET', '/shows/calendar?city=City 1&state=NY&when=weekend&format=json', None, 200),
+  ('create_shows', 'GET', '/shows/create', None, 200),
+  ('create_show_submission', 'POST', '/shows/create', SHOW, 200),
+  ('api_venues', 'GET', '/api/v1/venues?limit=100', None, 200),
+  ('api_artists', 'GET', '/api/v1/artists?limit=100&fields=id,name,genres', None, 200),
+  ('api_shows', 'GET', '/api/v1/shows?limit=100&after=2000-01-01T00:00:00,0', None, 200),
+]
+
+SCRATCH = dict(delete_venue = scratch_venues)
+
+def percentile(values, p):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+@pytest.mark.parametrize('route, method, url, data, status', ROUTES)
+def test_route(request, app, client, baseline, results, route, method, url, data, status):
+  rounds = request.config.getoption('--rounds')
+  counter = iter(SCRATCH[route](app, rounds + 1)) if route in SCRATCH else itertools.count(2)
+  def send():
+    n = next(counter)
+    form = {k: v.format(n=n) if isinstance(v, str) else v for (k, v) in data.items()} if data else None
+    # buffered, so streamed responses are read, and measured, in full
+    return client.open(url.format(n=n), method=method, data=form, buffered=True)
+
+  response = send()
+  assert response.status_code == status
+
+  queries = 0
+  timings = []
+  for _ in range(rounds):
+    with app.app_context():
+      pages.clear()
+    with count_queries() as statements:
+      started = time.perf_counter()
+      response = send()
+      timings.append(time.perf_counter() - started)
+    assert response.status_code == status
+    queries = max(queries, statements.count)
+
+  measured = results[route] = dict(
+    queries = queries,
+    p50_ms = round(percentile(timings, 50) * 1000, 3),
+    p95_ms = round(percentile(timings, 95) * 1000, 3))
+  if request.config.getoption('--update-baseline'):
+    return
+
+  assert route in baseline, f'{route} has no baseline; run pytest tests --update-baseline'
+  expected = baseline[route]
+  assert measured['queries'] <= expected['queries'], f'{route} ran {measured["queries"]} SQL statements, baseline is {expected["queries"]}'
+  if request.config.getoption('--check-latency'):
+    limit = expected['p95_ms'] * request.config.getoption('--latency-tolerance')
+    assert measured['p95_ms'] <= limit, f'{route} p95 is {measured["p95_ms"]}ms, limit is {limit:.3f}ms'
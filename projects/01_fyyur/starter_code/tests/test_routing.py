@@ -0,0 +1,58 @@
+#----------------------------------------------------------------------------#
+# Read/write routing, with a copy of the SQLite benchmark database standing
+# in for the replica. Writes don't reach the copy, which makes replica
+# reads easy to tell apart from primary reads.
+#----------------------------------------------------------------------------#
+import shutil
+import pytest
+from sqlalchemy import func
+from cache import pages
+from config import db
+from instrumentation import count_queries
+from models import Venue
+from test_routes import VENUE
+
+@pytest.fixture
+def primary(app):
+  return db.get_engine(app)
+
+@pytest.fixture
+def replica(app, primary, tmp_path):
+  if primary.url.get_backend_name() != 'sqlite':
+    pytest.skip('the replica is a copy of the SQLite database file')
+  path = tmp_path / 'replica.db'
+  shutil.copyfile(primary.url.database, path)
+  app.config['SQLALCHEMY_BINDS'] = {'replica': 'sqlite:///' + str(path)}
+  with app.app_context():
+    pages.clear()
+  yield db.get_engine(app, bind='replica')
+  app.config['SQLALCHEMY_BINDS'] = None
+  with app.app_context():
+    pages.clear()
+
+def test_get_reads_from_replica(client, primary, replica):
+  with count_queries(primary) as writes, count_queries(replica) as reads:
+    assert client.get('/venues/1').status_code == 200
+  assert writes.count == 0
+  assert reads.count > 0
+
+def test_writer_reads_its_own_writes(app, client, primary, replica):
+  with count_queries(primary) as writes, count_queries(replica) as reads:
+    assert client.post('/venues/create', data=VENUE).status_code == 200
+  assert writes.count > 0
+  assert reads.count == 0
+
+  with app.app_context():
+    venue_id = db.session.query(func.max(Venue.id)).scalar()
+  assert client.get('/venues/%d' % venue_id).status_code == 200
+
+  with app.app_context():
+    pages.clear()
+  assert app.test_client().get('/venues/%d' % venue_id).status_code == 404
+
+def test_writer_is_not_served_pages_cached_from_the_replica(app, client, primary, replica):
+  client.post('/venues/create', data=dict(VENUE, name = 'Sticky Venue'))
+  client.get('/')
+  # rendered from the replica, which hasn't got the venue, and cached
+  assert 'Sticky Venue' not in app.test_client().get('/venues').get_data(as_text=True)
+  assert 'Sticky Venue' in client.get('/venues').get_data(as_text=True)
@@ -0,0 +1,92 @@
+#----------------------------------------------------------------------------#
+# The baseline migration, stamping databases onto it, and snapshots.
+#----------------------------------------------------------------------------#
+import os
+import pytest
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+from config import db, basedir
+import schema
+
+def test_baseline_matches_the_models(app):
+  # the benchmark database is created by schema.create_schema
+  with db.get_engine(app).connect() as connection:
+    assert connection.execute(text('SELECT version_num FROM alembic_version')).scalar() == schema.BASELINE
+    assert schema.schema_differences(connection) == []
+
+def test_baseline_upgrades_the_released_head():
+  script = ScriptDirectory(os.path.join(basedir, 'migrations'))
+  assert script.get_heads() == [schema.BASELINE]
+  assert script.get_revision(schema.BASELINE).down_revision == schema.RELEASED_HEAD
+  chain = [revision.revision for revision in script.walk_revisions()]
+  assert chain[:2] == [schema.BASELINE, schema.RELEASED_HEAD] and chain[-1] == '9d7592ee91f8'
+
+@pytest.fixture
+def engine(tmp_path):
+  engine = create_engine('sqlite:///' + str(tmp_path / 'old.db'))
+  yield engine
+  engine.dispose()
+
+def version(engine):
+  with engine.connect() as connection:
+    return connection.execute(text('SELECT version_num FROM alembic_version')).scalar()
+
+def test_stamps_a_database_with_the_baseline_schema(app, engine):
+  db.metadata.create_all(engine)
+  with app.app_context(), engine.begin() as connection:
+    assert schema.stamp_baseline(connection) == []
+  assert version(engine) == schema.BASELINE
+
+def test_refuses_a_database_with_another_schema(app, engine):
+  db.metadata.create_all(engine)
+  with engine.begin() as connection:
+    connection.execute(text('DROP INDEX "ix_Show_start_time_id"'))
+  with app.app_context(), engine.begin() as connection:
+    with pytest.raises(ValueError, match='ix_Show_start_time_id'):
+      schema.stamp_baseline(connection)
+
+def test_refuses_databases_at_other_revisions(app, engine):
+  db.metadata.create_all(engine)
+  with engine.begin() as connection:
+    connection.execute(text('CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL PRIMARY KEY)'))
+    connection.execute(text('INSERT INTO alembic_version VALUES (:version)'), dict(version = schema.RELEASED_HEAD))
+  with app.app_context(), engine.begin() as connection:
+    with pytest.raises(ValueError, match='flask db upgrade'):
+      schema.stamp_baseline(connection)
+  assert version(engine) == schema.RELEASED_HEAD
+
+def test_stamp_command_leaves_the_baseline_alone(app):
+  result = app.test_cli_runner().invoke(args=['fyyur', 'stamp-baseline'])
+  assert result.exit_code == 0
+  assert 'nothing to do' in result.output and schema.BASELINE in result.output
+
+def test_create_db_command_refuses_a_database_with_tables(app):
+  result = app.test_cli_runner().invoke(args=['fyyur', 'create-db'])
+  assert result.exit_code != 0 and 'not empty' in result.output
+
+def test_clones_are_copies_of_one_template(tmp_path, monkeypatch):
+  monkeypatch.setattr(schema, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+  builds = []
+  def build(url):
+    builds.append(url)
+    engine = create_engine(url)
+    with engine.begin() as connection:
+      connection.execute(text('CREATE TABLE t (n INTEGER)'))
+      connection.execute(text('INSERT INTO t VALUES (1)'))
+    engine.dispose()
+
+  urls = ['sqlite:///' + str(tmp_path / name) for name in ('a.db', 'b.db')]
+  assert schema.clone_database(urls[0], 'k', build) is True
+  assert schema.clone_database(urls[1], 'k', build) is False
+  assert len(builds) == 1
+
+  first = create_engine(urls[0])
+  with first.begin() as connection:
+    connection.execute(text('INSERT INTO t VALUES (2)'))
+  first.dispose()
+  second = create_engine(urls[1])
+  with second.connect() as connection:
+    assert connection.execute(text('SELECT count(*) FROM t')).scalar() == 1
+  second.dispose()
+
+  assert schema.snapshot_key('seed', 1) != schema.snapshot_key('seed', 2)
@@ -0,0 +1,28 @@
+#----------------------------------------------------------------------------#
+# Template bytecode cache and warm-up.
+#----------------------------------------------------------------------------#
+from jinja2 import Environment
+from instrumentation import TimedTemplate
+from templating import setup_templates, warm_templates
+
+def test_warm_up_fills_the_bytecode_cache(app, tmp_path):
+  environment = app.jinja_env
+  saved = (environment.bytecode_cache, dict(app.config))
+  try:
+    app.config.update(TEMPLATE_CACHE_DIR = str(tmp_path), TEMPLATE_WARMUP = True)
+    environment.cache.clear()
+    setup_templates(app)
+    names = warm_templates(app)
+    assert 'layouts/main.html' in names and 'pages/venues.html' in names
+    assert len(list(tmp_path.iterdir())) == len(names)
+    assert isinstance(environment.get_template('pages/venues.html'), TimedTemplate)
+
+    # a fresh environment loads the cached bytecode instead of compiling
+    fresh = Environment(loader=environment.loader, bytecode_cache=environment.bytecode_cache)
+    fresh.compile = None
+    fresh.get_template('pages/venues.html')
+  finally:
+    environment.bytecode_cache = saved[0]
+    app.config.clear()
+    app.config.update(saved[1])
+    environment.cache.clear()